@@ -2,15 +2,22 @@
 
 from PyQt5.Qt import QHBoxLayout, QGridLayout, \
     QPushButton, QLabel, QSlider, QSpinBox, QDoubleSpinBox, QImage, QPixmap, \
-    QFrame, QFileDialog, QTextEdit, QRadioButton
+    QFrame, QFileDialog, QRadioButton, QCheckBox, QProgressBar
 from PyQt5 import QtCore
 
 import os
 import sys
+import time
 import numpy as np
 import json
 import functools
+from uArm.sender import GcodeSender
 from .handler import GcodeHandler
+from .preview_ui import ToolpathPreview
+from .text_view_ui import GcodeTextView
+from .lib.contour.arcs import arc_extents
+from .lib.contour.gcode import transform_lines
+from .lib.contour.toolpath import Lines
 
 icon_path = os.path.join(os.path.split(sys.path[0])[0], 'icon')
 if not os.path.exists(icon_path):
@@ -53,6 +60,7 @@ class GcodeUI(object):
         self.isOutlineMode = True
         self.isLaserMode = True
         self.handler = GcodeHandler(self)
+        self.sender = None
         self.set_ui()
         self.connect_slot()
         self.gcode = ''
@@ -76,7 +84,7 @@ class GcodeUI(object):
         self.up_left_layout = QHBoxLayout(up_left_frame)
         self.up_right_layout = QHBoxLayout(up_right_frame)
         self.up_layout.addWidget(up_left_frame)
-        # self.up_layout.addWidget(up_right_frame)
+        self.up_layout.addWidget(up_right_frame)
         self.layout.addWidget(self.up_frame)
 
         self.label_img = QLabel()
@@ -93,17 +101,9 @@ class GcodeUI(object):
 
         self.up_left_layout.addWidget(self.label_img)
 
-        self.label_img_preview = QLabel()
-        # self.label_img_preview.setMaximumHeight(320)
-        # self.label_img_preview.setMaximumWidth(480)
-        self.label_img_preview.setDisabled(True)
-        # # self.label_img_preview.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
-        # # self.label_img_preview.setScaledContents(True)
-        # data = np.zeros(320 * 240)
-        # img = QImage(data, 320, 240, QImage.Format_RGB888)
-        # pixmap = QPixmap.fromImage(img)
-        # self.label_img_preview.setPixmap(pixmap)
-        self.up_right_layout.addWidget(self.label_img_preview)
+        # toolpath of the generated GCode
+        self.preview = ToolpathPreview()
+        self.up_right_layout.addWidget(self.preview)
         # self.up_frame.hide()
 
     def _set_middle_frame_ui(self):
@@ -342,26 +342,62 @@ class GcodeUI(object):
         self.middle_right_layout.addWidget(self.spinbox_scale, row, 2)
 
         row += 1
+        # max distance (mm) between the curves and the generated lines
         label_resolution = QLabel('resolution:')
         self.slider_resolution = QSlider(QtCore.Qt.Horizontal)
         self.slider_resolution.setMinimum(1)
-        self.slider_resolution.setMaximum(100)
-        self.slider_resolution.setValue(10)
+        self.slider_resolution.setMaximum(200)
+        self.slider_resolution.setValue(20)
         self.spinbox_resolution = QDoubleSpinBox()
-        self.spinbox_resolution.setMinimum(0.1)
-        self.spinbox_resolution.setMaximum(10.0)
-        self.spinbox_resolution.setSingleStep(0.1)
-        self.spinbox_resolution.setDecimals(1)
-        self.spinbox_resolution.setValue(1.0)
-        self.slider_resolution.setDisabled(True)
-        self.spinbox_resolution.setDisabled(True)
+        self.spinbox_resolution.setMinimum(0.01)
+        self.spinbox_resolution.setMaximum(2.0)
+        self.spinbox_resolution.setSingleStep(0.01)
+        self.spinbox_resolution.setDecimals(2)
+        self.spinbox_resolution.setValue(0.2)
+        # self.slider_resolution.setDisabled(True)
+        # self.spinbox_resolution.setDisabled(True)
+        self.slider_resolution.mouseReleaseEvent = functools.partial(self.mouseReleaseEvent,
+                                                                     source=self.slider_resolution.mouseReleaseEvent)
+        self.spinbox_resolution.focusOutEvent = functools.partial(self.focusOutEvent,
+                                                                  source=self.spinbox_resolution.focusOutEvent)
         self.middle_right_layout.addWidget(label_resolution, row, 0)
         self.middle_right_layout.addWidget(self.slider_resolution, row, 1)
         self.middle_right_layout.addWidget(self.spinbox_resolution, row, 2)
 
+        row += 1
+        # points closer than this (mm) to the simplified lines are dropped, 0 = off
+        label_simplify = QLabel('simplify:')
+        self.slider_simplify = QSlider(QtCore.Qt.Horizontal)
+        self.slider_simplify.setMinimum(0)
+        self.slider_simplify.setMaximum(200)
+        self.slider_simplify.setValue(0)
+        self.spinbox_simplify = QDoubleSpinBox()
+        self.spinbox_simplify.setMinimum(0.0)
+        self.spinbox_simplify.setMaximum(2.0)
+        self.spinbox_simplify.setSingleStep(0.01)
+        self.spinbox_simplify.setDecimals(2)
+        self.spinbox_simplify.setValue(0.0)
+        self.slider_simplify.mouseReleaseEvent = functools.partial(self.mouseReleaseEvent,
+                                                                   source=self.slider_simplify.mouseReleaseEvent)
+        self.spinbox_simplify.focusOutEvent = functools.partial(self.focusOutEvent,
+                                                                source=self.spinbox_simplify.focusOutEvent)
+        self.middle_right_layout.addWidget(label_simplify, row, 0)
+        self.middle_right_layout.addWidget(self.slider_simplify, row, 1)
+        self.middle_right_layout.addWidget(self.spinbox_simplify, row, 2)
+
         row += 1
         self.btn_generate_gcode = QPushButton('Generate_Gcode')
+        self.checkbox_optimize_travel = QCheckBox('OptimizeTravel')
+        # resolution applies to the scaled output instead of the SVG
+        self.checkbox_adaptive = QCheckBox('Adaptive')
         self.middle_right_layout.addWidget(self.btn_generate_gcode, row, 0)
+        self.middle_right_layout.addWidget(self.checkbox_optimize_travel, row, 1)
+        self.middle_right_layout.addWidget(self.checkbox_adaptive, row, 2)
+
+        row += 1
+        # fit G2/G3 arcs within the resolution tolerance
+        self.checkbox_arcs = QCheckBox('G2/G3')
+        self.middle_right_layout.addWidget(self.checkbox_arcs, row, 1)
 
         row += 1
         self.label_x_min = QLabel('')
@@ -375,13 +411,49 @@ class GcodeUI(object):
         self.middle_right_layout.addWidget(self.label_y_min, row, 0)
         self.middle_right_layout.addWidget(self.label_y_max, row, 1)
 
+        row += 1
+        self.label_travel = QLabel('')
+        self.label_render_time = QLabel('')
+        self.label_points = QLabel('')
+        self.middle_right_layout.addWidget(self.label_travel, row, 0)
+        self.middle_right_layout.addWidget(self.label_render_time, row, 1)
+        self.middle_right_layout.addWidget(self.label_points, row, 2)
+
+        row += 1
+        self.label_job = QLabel('')
+        self.middle_right_layout.addWidget(self.label_job, row, 0, 1, 3)
+
+        row += 1
+        # stream the program to the uArm connected in the uArm tab
+        self.btn_send = QPushButton('Send')
+        self.btn_pause = QPushButton('Pause')
+        self.btn_stop = QPushButton('Stop')
+        self.btn_pause.setDisabled(True)
+        self.btn_stop.setDisabled(True)
+        self.middle_right_layout.addWidget(self.btn_send, row, 0)
+        self.middle_right_layout.addWidget(self.btn_pause, row, 1)
+        self.middle_right_layout.addWidget(self.btn_stop, row, 2)
+
+        row += 1
+        self.progress_send = QProgressBar()
+        self.progress_send.setValue(0)
+        self.label_send = QLabel('')
+        self.middle_right_layout.addWidget(self.progress_send, row, 0, 1, 2)
+        self.middle_right_layout.addWidget(self.label_send, row, 2)
+
+        row += 1
+        self.progress_convert = QProgressBar()
+        self.progress_convert.setValue(0)
+        self.progress_convert.hide()
+        self.middle_right_layout.addWidget(self.progress_convert, row, 0, 1, 2)
+
     def _set_down_frame_ui(self):
         self.down_frame = QFrame()
         self.down_layout = QHBoxLayout(self.down_frame)
         self.layout.addWidget(self.down_frame)
 
-        self.textEdit = QTextEdit()
-        self.down_layout.addWidget(self.textEdit)
+        self.text_view = GcodeTextView()
+        self.down_layout.addWidget(self.text_view)
         # self.down_frame.hide()
 
     def select_engrave_mode(self, event):
@@ -395,9 +467,17 @@ class GcodeUI(object):
         self.generate_gcode()
         # print('outline: {}, laser: {}'.format(self.isOutlineMode, self.isLaserMode))
 
+    def select_optimize_travel(self, event):
+        self.handler.optimize_travel = event
+        if self.handler.template is not None or self.handler.converting:
+            self.handler.cancel()
+            self.handler.template = None
+            self.generate_gcode(flag=True)
+
     def connect_slot(self):
         self.checkbox_outline.toggled.connect(self.select_engrave_mode)
         self.checkbox_laser.toggled.connect(self.select_end_type)
+        self.checkbox_optimize_travel.toggled.connect(self.select_optimize_travel)
         self.btn_load_img.clicked.connect(self.load_image)
 
         self.slider_x_home.valueChanged.connect(
@@ -441,9 +521,15 @@ class GcodeUI(object):
             functools.partial(self.slider_spinbox_related, slave=self.slider_scale, scale=10))
 
         self.slider_resolution.valueChanged.connect(
-            functools.partial(self.slider_spinbox_related, slave=self.spinbox_resolution, scale=.1))
+            functools.partial(self.slider_spinbox_related, slave=self.spinbox_resolution, scale=.01))
         self.spinbox_resolution.valueChanged.connect(
-            functools.partial(self.slider_spinbox_related, slave=self.slider_resolution, scale=10))
+            functools.partial(self.slider_spinbox_related, slave=self.slider_resolution, scale=100))
+        self.slider_simplify.valueChanged.connect(
+            functools.partial(self.slider_spinbox_related, slave=self.spinbox_simplify, scale=.01))
+        self.spinbox_simplify.valueChanged.connect(
+            functools.partial(self.slider_spinbox_related, slave=self.slider_simplify, scale=100))
+        self.checkbox_adaptive.toggled.connect(lambda event: self.generate_gcode())
+        self.checkbox_arcs.toggled.connect(lambda event: self.generate_gcode())
 
         self.slider_drawing_feedrate.valueChanged.connect(
             functools.partial(self.slider_spinbox_related, slave=self.spinbox_drawing_feedrate, scale=1))
@@ -456,10 +542,16 @@ class GcodeUI(object):
             functools.partial(self.slider_spinbox_related, slave=self.slider_moving_feedrate, scale=1))
 
         self.btn_generate_gcode.clicked.connect(functools.partial(self.generate_gcode, flag=True))
+        self.btn_send.clicked.connect(self.send_gcode)
+        self.btn_pause.clicked.connect(self.pause_send)
+        self.btn_stop.clicked.connect(self.stop_send)
 
     def slider_spinbox_related(self, value, master=None, slave=None, scale=1):
         try:
-            slave.setValue(value * scale)
+            if isinstance(slave, QSlider):
+                slave.setValue(int(round(value * scale)))
+            else:
+                slave.setValue(value * scale)
         except Exception as e:
             print(e)
 
@@ -477,9 +569,32 @@ class GcodeUI(object):
             print(e)
         source(event)
 
+    def tolerance(self, value):
+        """
+        Tolerance in SVG millimeters, divided by the scale in adaptive mode
+        so that it holds on the scaled output.
+        """
+        if self.checkbox_adaptive.isChecked():
+            value /= self.spinbox_scale.value()
+        return round(value, 4)
+
     def generate_gcode(self, flag=False):
+        flat = self.tolerance(self.spinbox_resolution.value())
+        simplify = self.tolerance(self.spinbox_simplify.value())
+        arcs = flat if self.checkbox_arcs.isChecked() else 0
+        if flat != self.handler.flat or simplify != self.handler.simplify or arcs != self.handler.arcs:
+            self.handler.flat = flat
+            self.handler.simplify = simplify
+            self.handler.arcs = arcs
+            if self.handler.template is not None or self.handler.converting:
+                # the curves have to be flattened again
+                self.handler.cancel()
+                self.handler.template = None
+                flag = True
         if self.handler.template is None and flag:
-            self.handler.svg_to_gcode()
+            # rendered once the conversion thread is done, see convert_finished
+            self.handler.svg_to_gcode_async()
+            return
         if self.handler.template:
             pen_up = self.spinbox_pen_up.value() if not self.isLaserMode else 0
             config = {
@@ -492,9 +607,38 @@ class GcodeUI(object):
                 'moving_feedrate': self.spinbox_moving_feedrate.value(),
                 'drawing_feedrate': self.spinbox_drawing_feedrate.value(),
             }
-            self.gcode = self.handler.template.format(**config)
-            self.change_gcode()
-            # self.textEdit.setText(self.gcode)
+            start = time.time()
+            if self.handler.toolpath is not None:
+                self.render_toolpath(config)
+            else:
+                self.preview.clear()
+                self.label_job.setText('')
+                self.gcode = self.handler.template.format(**config)
+                self.change_gcode()
+            self.label_render_time.setText('Render: {:.3f}s'.format(time.time() - start))
+
+    def render_toolpath(self, config):
+        toolpath = self.handler.toolpath
+        xy = toolpath.transform(config,
+                                scale=self.spinbox_scale.value(),
+                                x_offset=self.spinbox_x_offset.value(),
+                                y_offset=self.spinbox_y_offset.value())
+        bounds = toolpath.extents(config,
+                                  scale=self.spinbox_scale.value(),
+                                  x_offset=self.spinbox_x_offset.value(),
+                                  y_offset=self.spinbox_y_offset.value())
+        if bounds is not None:
+            x_min, x_max, y_min, y_max = [round(v, 2) for v in bounds]
+            self.label_x_min.setText('X(min): ' + str(x_min))
+            self.label_x_max.setText('X(max): ' + str(x_max))
+            self.label_y_min.setText('Y(min): ' + str(y_min))
+            self.label_y_max.setText('Y(max): ' + str(y_max))
+        stats = toolpath.stats(config, scale=self.spinbox_scale.value())
+        minutes, seconds = divmod(int(round(stats['time'])), 60)
+        self.label_job.setText('Draw: {:.1f}mm, travel: {:.1f}mm, segments: {}, time: {}:{:02d}:{:02d}'.format(
+            stats['draw_length'], stats['travel_length'], stats['segments'], minutes // 60, minutes % 60, seconds))
+        self.preview.set_toolpath(toolpath.ops, xy, toolpath.ij * self.spinbox_scale.value())
+        self.text_view.set_lines(Lines(toolpath, config, xy, scale=self.spinbox_scale.value()))
 
     def change_gcode(self):
         if self.gcode:
@@ -505,38 +649,20 @@ class GcodeUI(object):
             drawing_feedrate = self.spinbox_drawing_feedrate.value()
             scale = self.spinbox_scale.value()
 
-            lines = self.gcode.split('\n')
-            for i, line in enumerate(lines):
-                List = line.strip().split(' ')
-                line = ''
-                for l in List:
-                    if l.startswith('F'):
-                        if line.startswith(('G01', 'G1')):
-                            l = 'F{}'.format(drawing_feedrate)
-                        elif line.startswith(('G00', 'G0')):
-                            l = 'F{}'.format(moving_feedrate)
-                    elif l.startswith('X'):
-                        x = float(l[1:]) * scale + x_offset
-                        l = 'X{0:.2f}'.format(x)
-                    elif l.startswith('Y'):
-                        y = float(l[1:]) * scale + y_offset
-                        l = 'Y{0:.2f}'.format(y)
-                    # elif l.startswith('Z'):
-                    #     z = float(l[1:]) + z_offset
-                    #     l = 'Z{0:.2f}'.format(z)
-                    line += l + ' '
-                line = line.strip()
-                lines[i] = line
+            lines = transform_lines(self.gcode.split('\n'), scale, x_offset, y_offset,
+                                    moving_feedrate, drawing_feedrate)
             self.calc_gcode(lines)
-            gcode = '\n'.join(lines)
-            self.textEdit.setText(gcode)
+            self.text_view.set_lines(lines)
 
     def calc_gcode(self, lines):
         x_list = []
         y_list = []
+        x = y = None
         for i, line in enumerate(lines):
-            if line.startswith(tuple(['G0', 'G1', 'G00', 'G01'])):
+            if line.startswith(tuple(['G0', 'G1', 'G00', 'G01', 'G2', 'G3', 'G02', 'G03'])):
                 List = line.strip().split(' ')
+                x0, y0 = x, y
+                arc = {}
                 for l in List:
                     if l.startswith('X'):
                         x = float(l[1:])
@@ -544,6 +670,14 @@ class GcodeUI(object):
                     elif l.startswith('Y'):
                         y = float(l[1:])
                         y_list.append(y)
+                    elif l.startswith(('I', 'J')):
+                        arc[l[0]] = float(l[1:])
+                if arc and x0 is not None and y0 is not None:
+                    # an arc may bulge past its ends
+                    clockwise = List[0] in ('G2', 'G02')
+                    for px, py in arc_extents(x0, y0, x, y, arc.get('I', 0), arc.get('J', 0), clockwise):
+                        x_list.append(round(px, 2))
+                        y_list.append(round(py, 2))
         if len(x_list) > 0:
             x_min = np.min(x_list)
             x_max = np.max(x_list)
@@ -557,14 +691,96 @@ class GcodeUI(object):
             self.label_y_max.setText('Y(max): ' + str(y_max))
             # print('y_min: {}, y_max: {}, y_distance: {}'.format(y_min, y_max, y_max - y_min))
 
+    def update_convert_progress(self, done, total):
+        self.progress_convert.show()
+        self.progress_convert.setMaximum(total)
+        self.progress_convert.setValue(done)
+
+    def convert_finished(self):
+        self.progress_convert.hide()
+        self.update_travel_info()
+        self.generate_gcode()
+
+    def update_travel_info(self):
+        stats = self.handler.stats
+        if stats and stats.get('polylines') and self.handler.optimize_travel:
+            self.label_travel.setText('Travel: {:.1f} -> {:.1f} ({:.2f}s)'.format(
+                stats['travel_before'], stats['travel_after'], stats['time']))
+        else:
+            self.label_travel.setText('')
+        if stats:
+            self.label_points.setText('Points: {} ({:.3f}mm), removed: {}'.format(
+                stats.get('points', 0), self.handler.flat, stats.get('removed', 0)))
+        else:
+            self.label_points.setText('')
+
+    def send_gcode(self):
+        arm = self.main_ui.uarm_ui.handler.arm
+        if not arm or not arm.connected:
+            self.label_send.setText('uArm is not connected')
+            return
+        lines = self.text_view.model.lines
+        if not len(lines):
+            return
+        self.sender = GcodeSender(arm, lines)
+        self.sender.progress.connect(self.update_send_progress)
+        self.sender.done.connect(self.send_finished)
+        # busy until the sender has counted the commands
+        self.progress_send.setMaximum(0)
+        self.progress_send.setValue(0)
+        self.btn_send.setDisabled(True)
+        self.btn_pause.setDisabled(False)
+        self.btn_pause.setText('Pause')
+        self.btn_stop.setDisabled(False)
+        self.sender.start()
+
+    def pause_send(self):
+        if self.sender is None:
+            return
+        if self.sender.paused:
+            self.sender.resume()
+            self.btn_pause.setText('Pause')
+        else:
+            self.sender.pause()
+            self.btn_pause.setText('Resume')
+
+    def stop_send(self):
+        if self.sender is not None:
+            self.sender.stop()
+
+    def update_send_progress(self, progress):
+        self.progress_send.setMaximum(max(progress['total'], 1))
+        self.progress_send.setValue(progress['acked'])
+        self.label_send.setText('{}/{} {:.1f} line/s{}'.format(
+            progress['acked'], progress['total'], progress['rate'],
+            ', errors: {}'.format(progress['errors']) if progress['errors'] else ''))
+
+    def send_finished(self, result):
+        self.update_send_progress(result)
+        if result['error']:
+            self.label_send.setText(self.label_send.text() + ' (stopped: {})'.format(result['error']))
+        elif result['stopped']:
+            self.label_send.setText(self.label_send.text() + ' (stopped)')
+        self.btn_send.setDisabled(False)
+        self.btn_pause.setDisabled(True)
+        self.btn_pause.setText('Pause')
+        self.btn_stop.setDisabled(True)
+        # done is emitted from run(), the thread may not be done yet
+        self.handler.release(self.sender)
+        self.sender = None
+
     def load_image(self):
         fname = QFileDialog.getOpenFileName(self.main_ui.window, 'Open file', '', '*.svg')
         if fname and fname[0]:
             img = QImage()
             if img.load(fname[0]):
                 self.label_img.setPixmap(QPixmap.fromImage(img))
+                self.handler.cancel()
+                self.progress_convert.hide()
                 with open(fname[0], 'rb') as f:
                     self.handler.source = f.read()
                     self.handler.template = None
+                    self.handler.toolpath = None
                     self.gcode = None
+                    self.preview.clear()
                     self.up_frame.show()
@@ -6,7 +6,59 @@
 #
 # Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
 
+import os
+import time
+from PyQt5.Qt import QThread
+from PyQt5.QtCore import pyqtSignal
+
 from .lib.contour.parse import SVGParser
+from .lib.contour.cache import ToolpathCache
+from .lib.contour.svg import FLATNESS
+
+cache_path = os.path.join('.', 'cache', 'toolpath')
+
+# sources from this size (bytes) are read with the streaming SVG reader
+streaming_size = 16 * 1024 * 1024
+
+
+class ConvertThread(QThread):
+    """
+    Convert an SVG to a GCode template off the Qt main thread.
+    """
+    progress = pyqtSignal(int, int)
+    result = pyqtSignal(dict)
+
+    # seconds between two progress signals
+    PROGRESS_INTERVAL = 0.05
+
+    def __init__(self, source, **kwargs):
+        super(ConvertThread, self).__init__()
+        self.source = source
+        self.parser = SVGParser(**kwargs)
+        self.last_progress = 0
+
+    def run(self):
+        try:
+            template = self.parser.convert(self.source, progress=self.report_progress)
+        except Exception as e:
+            print(e)
+            template = None
+        if not self.parser.cancelled:
+            self.result.emit({
+                'thread': self,
+                'template': template,
+                'toolpath': self.parser.toolpath if template else None,
+                'stats': self.parser.stats,
+            })
+
+    def report_progress(self, done, total):
+        now = time.time()
+        if now - self.last_progress >= self.PROGRESS_INTERVAL or done == total:
+            self.last_progress = now
+            self.progress.emit(done, total)
+
+    def cancel(self):
+        self.parser.cancel()
 
 
 class GcodeHandler(object):
@@ -15,13 +67,84 @@ class GcodeHandler(object):
         self.ui = ui
         self.source = None
         self.template = None
+        self.toolpath = None
+        self.optimize_travel = False
+        # flatten big SVGs across all cores, in spawned worker processes
+        # (see parallel.ParallelBatch.pool) since the parse runs in a QThread
+        self.parallel = True
+        # flattening tolerance (mm)
+        self.flat = FLATNESS
+        # polyline simplification tolerance (mm), 0 to disable
+        self.simplify = 0
+        # arc fitting tolerance (mm), 0 to draw lines only
+        self.arcs = 0
+        self.cache = ToolpathCache(cache_path)
+        self.stats = {}
+        self.thread = None
+        # released threads, kept alive until they return
+        self.stopping = []
 
     def svg_to_gcode(self):
         if self.source:
-            parser = SVGParser(return_template=True)
+            parser = SVGParser(return_template=True, toolpath=True, optimize_travel=self.optimize_travel,
+                               parallel=self.parallel, cache=self.cache, flat=self.flat,
+                               simplify=self.simplify, arcs=self.arcs,
+                               streaming=len(self.source) >= streaming_size)
             self.template = parser.convert(self.source)
+            self.toolpath = parser.toolpath
+            self.stats = parser.stats
         return self.template
 
+    def svg_to_gcode_async(self):
+        """
+        Start converting the source in a ConvertThread, the UI is told
+        about the progress and the result through its signals.
+        """
+        if self.thread is not None:
+            return
+        if self.source:
+            self.thread = ConvertThread(self.source, return_template=True, toolpath=True,
+                                        optimize_travel=self.optimize_travel, parallel=self.parallel,
+                                        cache=self.cache, flat=self.flat, simplify=self.simplify,
+                                        arcs=self.arcs, streaming=len(self.source) >= streaming_size)
+            self.thread.progress.connect(self.ui.update_convert_progress)
+            self.thread.result.connect(self.convert_finished)
+            self.thread.start()
+
+    def convert_finished(self, result):
+        if result['thread'] is not self.thread:
+            return
+        # the result is emitted from run(), the thread may not be done yet
+        self.release(self.thread)
+        self.thread = None
+        self.template = result['template']
+        self.toolpath = result['toolpath']
+        self.stats = result['stats']
+        self.ui.convert_finished()
+
+    def cancel(self):
+        """
+        Cancel the running conversion, if any.
+        """
+        if self.thread is not None:
+            thread = self.thread
+            self.thread = None
+            thread.cancel()
+            self.release(thread)
+
+    def release(self, thread):
+        """
+        Keep a reference to [thread] until it returns, Qt aborts if a
+        running QThread is destroyed.
+        """
+        if thread.isRunning():
+            self.stopping.append(thread)
+            thread.finished.connect(lambda: self.stopping.remove(thread))
+
+    @property
+    def converting(self):
+        return self.thread is not None
+
 if __name__ == '__main__':
     handler = GcodeHandler(None)
     with open('tmp.svg', 'rb') as f:
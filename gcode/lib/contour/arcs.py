@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+import math
+import numpy as np
+
+# Fewest segments replaced by an arc.
+MIN_SEGMENTS = 4
+
+# Largest sweep (radians) and radius (mm) of a fitted arc; flatter runs stay lines.
+MAX_SWEEP = math.pi
+MAX_RADIUS = 1000.0
+
+
+def circle_through(p1, p2, p3):
+    """
+    Center of the circle through three points, None if they are collinear.
+    """
+    ax, ay = p1
+    bx, by = p2
+    cx, cy = p3
+    d = 2.0 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if abs(d) < 1e-12:
+        return None
+    a2 = ax * ax + ay * ay
+    b2 = bx * bx + by * by
+    c2 = cx * cx + cy * cy
+    return ((a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d,
+            (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d)
+
+
+def check_arc(points, coords, i, j, tolerance):
+    """
+    Try to replace points[i..j] by one arc. Return (center, clockwise) when
+    every point and every chord midpoint is within [tolerance] of the
+    circle through points i, (i + j) // 2 and j, turning one way only.
+    [coords] are the points as a list, cheaper to index than the array.
+    """
+    center = circle_through(coords[i], coords[(i + j) // 2], coords[j])
+    if center is None:
+        return None
+    cx, cy = center
+    radius = math.hypot(coords[i][0] - cx, coords[i][1] - cy)
+    if radius > MAX_RADIUS:
+        return None
+    # most runs are rejected by the points next to the ends, before numpy
+    for k in (i + 1, j - 1):
+        if abs(math.hypot(coords[k][0] - cx, coords[k][1] - cy) - radius) > tolerance:
+            return None
+    run = points[i:j + 1] - center
+    mids = 0.5 * (run[:-1] + run[1:])
+    if np.abs(np.hypot(run[:, 0], run[:, 1]) - radius).max() > tolerance or \
+            np.abs(np.hypot(mids[:, 0], mids[:, 1]) - radius).max() > tolerance:
+        return None
+    cross = run[:-1, 0] * run[1:, 1] - run[:-1, 1] * run[1:, 0]
+    dot = run[:-1, 0] * run[1:, 0] + run[:-1, 1] * run[1:, 1]
+    if not ((cross > 0).all() or (cross < 0).all()):
+        return None
+    if np.abs(np.arctan2(cross, dot)).sum() > MAX_SWEEP:
+        return None
+    return center, bool(cross[0] < 0)
+
+
+def fit_arcs(points, tolerance, min_segments=MIN_SEGMENTS):
+    """
+    Split a polyline into moves from its first point: ('line', x, y) and
+    ('arc', x, y, cx, cy, clockwise) for the runs of points lying on a circle.
+    Arcs are grown by doubling, then by bisection.
+    """
+    points = np.asarray(points, dtype=float)[:, :2]
+    coords = points.tolist()
+    count = len(points)
+    moves = []
+    i = 0
+    while i < count - 1:
+        found = None
+        j = i + min_segments
+        if j < count:
+            found = check_arc(points, coords, i, j, tolerance)
+        if found is None:
+            moves.append(('line', coords[i + 1][0], coords[i + 1][1]))
+            i += 1
+            continue
+        good, step = j, min_segments
+        bad = None
+        while good + step < count:
+            arc = check_arc(points, coords, i, good + step, tolerance)
+            if arc is None:
+                bad = good + step
+                break
+            good, found = good + step, arc
+            step *= 2
+        if bad is None and good < count - 1:
+            arc = check_arc(points, coords, i, count - 1, tolerance)
+            if arc is None:
+                bad = count - 1
+            else:
+                good, found = count - 1, arc
+        while bad is not None and bad - good > 1:
+            mid = (good + bad) // 2
+            arc = check_arc(points, coords, i, mid, tolerance)
+            if arc is None:
+                bad = mid
+            else:
+                good, found = mid, arc
+        (cx, cy), clockwise = found
+        moves.append(('arc', coords[good][0], coords[good][1], cx, cy, clockwise))
+        i = good
+    return moves
+
+
+def arc_extents(x0, y0, x1, y1, i, j, clockwise):
+    """
+    Points bounding a G2/G3 arc from (x0, y0) to (x1, y1) with center offset
+    (i, j): both ends and the axis crossings within the sweep.
+    """
+    cx, cy = x0 + i, y0 + j
+    radius = math.hypot(i, j)
+    a0 = math.atan2(y0 - cy, x0 - cx)
+    a1 = math.atan2(y1 - cy, x1 - cx)
+    if clockwise:
+        a0, a1 = a1, a0
+    sweep = (a1 - a0) % (2 * math.pi)
+    points = [(x0, y0), (x1, y1)]
+    for k in range(4):
+        angle = k * math.pi / 2
+        if (angle - a0) % (2 * math.pi) < sweep:
+            points.append((cx + radius * math.cos(angle), cy + radius * math.sin(angle)))
+    return points
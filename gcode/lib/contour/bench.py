@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+"""
+Benchmark of the SVG to GCode pipeline on synthetic documents.
+
+    python -m gcode.lib.contour.bench [--preset medium] [--output run.json] [--compare base.json]
+
+Every stage is timed on its own, in pipeline order:
+    xml         SVGParser.parse_xml
+    traverse    SvgParser.iterTraverseSvg, path data collected but not parsed
+    parse       path data to nodes (CubicSuperPath / pathdata.parse_nodes)
+    subdivide   bezier subdivision into polylines
+    build       GCodeBuilder.draw_polyline + build
+    render      toolpath transform, extents, stats and render, the numeric GCode tab path
+    text        template format + gcode.transform_lines, the text GCode tab path
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import platform
+import argparse
+import numpy as np
+
+from . import flatten
+from . import pathdata
+from . import transform
+from .gcode import GCodeBuilder, transform_lines
+from .parse import SVGParser
+from .svg import FLATNESS, SvgParser, SvgPath
+from .svglib import cubicsuperpath
+from .svglib import simplepath
+from .svglib import simpletransform
+
+# name -> generate() keyword arguments
+PRESETS = {
+    'small': dict(paths=200, curves=8, arcs=0.1, depth=2, transforms=0.5, clones=0.05),
+    'medium': dict(paths=2000, curves=12, arcs=0.1, depth=3, transforms=0.5, clones=0.05),
+    'large': dict(paths=10000, curves=16, arcs=0.1, depth=4, transforms=0.5, clones=0.05),
+    'dense': dict(paths=500, curves=200, arcs=0.0, depth=1, transforms=0.2, clones=0.0),
+    'clones': dict(paths=2000, curves=6, arcs=0.0, depth=2, transforms=0.5, clones=0.5),
+}
+
+STAGES = ('xml', 'traverse', 'parse', 'subdivide', 'build', 'render', 'text')
+
+# GCode tab values used by the render stages
+CONFIG = {
+    'x_home': 150, 'y_home': 0, 'z_home': 90, 'z_offset': 90, 'pen_up': 10, 'z_offset_pen_up': 100,
+    'moving_feedrate': 1000, 'drawing_feedrate': 150,
+}
+
+
+def random_transform(rand):
+    kind = rand.randrange(4)
+    if kind == 0:
+        return 'translate(%.2f,%.2f)' % (rand.uniform(-50, 50), rand.uniform(-50, 50))
+    if kind == 1:
+        return 'rotate(%.1f %.1f %.1f)' % (rand.uniform(0, 360), rand.uniform(0, 800), rand.uniform(0, 400))
+    if kind == 2:
+        return 'scale(%.3f)' % rand.uniform(0.5, 1.5)
+    return 'matrix(%.3f %.3f %.3f %.3f %.2f %.2f)' % (
+        rand.uniform(0.8, 1.2), rand.uniform(-0.2, 0.2), rand.uniform(-0.2, 0.2), rand.uniform(0.8, 1.2),
+        rand.uniform(-20, 20), rand.uniform(-20, 20))
+
+
+def random_path(rand, curves, arcs):
+    """
+    Path data of [curves] relative cubic/arc commands starting anywhere on the page.
+    """
+    parts = ['M%.2f,%.2f' % (rand.uniform(0, 800), rand.uniform(0, 400))]
+    for _ in range(curves):
+        if rand.random() < arcs:
+            parts.append('a%.2f %.2f %.0f 0 %d %.2f %.2f' % (
+                rand.uniform(5, 30), rand.uniform(5, 30), rand.uniform(0, 90), rand.randrange(2),
+                rand.uniform(-20, 20), rand.uniform(-20, 20)))
+        else:
+            parts.append('c%.2f %.2f %.2f %.2f %.2f %.2f' % tuple(rand.uniform(-20, 20) for _ in range(6)))
+    if rand.random() < 0.5:
+        parts.append('z')
+    return ' '.join(parts)
+
+
+def generate(paths=2000, curves=12, arcs=0.1, depth=3, transforms=0.5, clones=0.05, seed=0):
+    """
+    Synthetic SVG document: [paths] paths of [curves] commands each, a part
+    [arcs] of them elliptical arcs, spread over groups nested [depth] deep,
+    a part [transforms] of the groups and paths transformed and a part
+    [clones] of the paths followed by a <use> clone of a shared symbol.
+    Some basic shapes are mixed in. The same arguments give the same document.
+    """
+    rand = random.Random(seed)
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"'
+             ' width="800" height="400">',
+             '<defs><g id="symbol"><path d="%s"/><circle cx="0" cy="0" r="6"/></g></defs>'
+             % random_path(rand, curves, arcs)]
+    per_group = max(1, int(math.ceil(paths ** (1.0 / max(depth, 1)))))
+
+    def attrs():
+        if rand.random() < transforms:
+            return ' transform="%s"' % random_transform(rand)
+        return ''
+
+    def group(level, count):
+        if level == depth or count <= per_group:
+            for _ in range(count):
+                kind = rand.random()
+                if kind < 0.9:
+                    parts.append('<path%s d="%s"/>' % (attrs(), random_path(rand, curves, arcs)))
+                elif kind < 0.95:
+                    parts.append('<circle%s cx="%.2f" cy="%.2f" r="%.2f"/>' % (
+                        attrs(), rand.uniform(0, 800), rand.uniform(0, 400), rand.uniform(1, 30)))
+                else:
+                    parts.append('<rect%s x="%.2f" y="%.2f" width="%.2f" height="%.2f"/>' % (
+                        attrs(), rand.uniform(0, 800), rand.uniform(0, 400), rand.uniform(1, 50), rand.uniform(1, 50)))
+                if rand.random() < clones:
+                    parts.append('<use xlink:href="#symbol" x="%.2f" y="%.2f"/>' % (
+                        rand.uniform(0, 800), rand.uniform(0, 400)))
+            return
+        size = int(math.ceil(float(count) / per_group))
+        for start in range(0, count, size):
+            parts.append('<g%s>' % attrs())
+            group(level + 1, min(size, count - start))
+            parts.append('</g>')
+
+    group(0, paths)
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+class Collect(object):
+    """
+    Stands in for parallel.ParallelBatch: keeps the (d, transform) of every
+    path so that the traversal is timed without parsing and flattening.
+    """
+    def __init__(self):
+        self.pending = []
+
+    def add(self, entity, d, node_transform):
+        self.pending.append((entity, (d, node_transform)))
+
+    def flush(self):
+        pass
+
+
+def run(svg_content, engine='numpy', flat=FLATNESS):
+    """
+    Time every stage on [svg_content], return (timings, counts).
+    """
+    timings = {}
+    t = time.time()
+    document = SVGParser.parse_xml(svg_content)
+    timings['xml'] = time.time() - t
+
+    t = time.time()
+    parser = SvgParser(document, engine='numpy', flat=flat)
+    jobs = Collect()
+    parser.entity_options['jobs'] = jobs
+    for _ in parser.iterTraverseSvg(parser.svg, parser.page_transform()):
+        pass
+    timings['traverse'] = time.time() - t
+    paths = [job for _, job in jobs.pending]
+
+    t = time.time()
+    if engine == 'numpy':
+        subpaths = [nodes for d, mat in paths for nodes in pathdata.parse_nodes(d, mat)]
+    else:
+        subpaths = []
+        for d, mat in paths:
+            path = cubicsuperpath.CubicSuperPath(simplepath.parsePath(d))
+            simpletransform.applyTransformToPath(transform.to_list(mat), path)
+            subpaths.extend(path)
+    timings['parse'] = time.time() - t
+
+    t = time.time()
+    if engine == 'numpy':
+        polylines = [points.tolist() for points in flatten.flatten_subpaths(subpaths, flat)]
+    else:
+        # _subdivide_cubic_bezier_path does not depend on the entity
+        legacy = SvgPath.__new__(SvgPath)
+        polylines = []
+        for cubic_bezier_path in subpaths:
+            legacy._subdivide_cubic_bezier_path(cubic_bezier_path, flat)
+            polylines.append([node[1] for node in cubic_bezier_path])
+    timings['subdivide'] = time.time() - t
+
+    t = time.time()
+    builder = GCodeBuilder({'return_template': True, 'toolpath': True})
+    for points in polylines:
+        builder.draw_polyline(points)
+    template = builder.build()
+    timings['build'] = time.time() - t
+
+    t = time.time()
+    toolpath = builder.toolpath
+    xy = toolpath.transform(CONFIG, scale=1.5, x_offset=10.0, y_offset=-5.0)
+    toolpath.extents(CONFIG, scale=1.5, x_offset=10.0, y_offset=-5.0)
+    toolpath.stats(CONFIG, scale=1.5)
+    toolpath.render(CONFIG, xy, scale=1.5)
+    timings['render'] = time.time() - t
+
+    t = time.time()
+    lines = template.format(**CONFIG).split('\n')
+    transform_lines(lines, 1.5, 10.0, -5.0, CONFIG['moving_feedrate'], CONFIG['drawing_feedrate'])
+    timings['text'] = time.time() - t
+
+    counts = {
+        'bytes': len(svg_content),
+        'paths': len(paths),
+        'subpaths': len(subpaths),
+        'points': sum(len(points) for points in polylines),
+        'lines': len(toolpath),
+    }
+    return timings, counts
+
+
+def benchmark(options, engine='numpy', repeat=3, flat=FLATNESS, seed=0):
+    """
+    Best of [repeat] runs of every stage on the document generate(**options).
+    """
+    t = time.time()
+    svg_content = generate(seed=seed, **options)
+    generated = time.time() - t
+    best = None
+    for _ in range(repeat):
+        timings, counts = run(svg_content, engine, flat)
+        if best is None:
+            best = timings
+        else:
+            best = dict((stage, min(best[stage], timings[stage])) for stage in STAGES)
+    best['total'] = sum(best[stage] for stage in STAGES)
+    return {
+        'options': options,
+        'engine': engine,
+        'flat': flat,
+        'seed': seed,
+        'repeat': repeat,
+        'generate': generated,
+        'counts': counts,
+        'timings': best,
+    }
+
+
+def compare(result, base):
+    """
+    Print the timings of [result] next to those of the same case in [base].
+    """
+    for key, case in sorted(result['cases'].items()):
+        old = base.get('cases', {}).get(key)
+        if old is None:
+            print('{}: not in the base run'.format(key))
+            continue
+        print(key)
+        for stage in STAGES + ('total',):
+            new_t, old_t = case['timings'][stage], old['timings'].get(stage)
+            if old_t:
+                print('  {:10s} {:8.3f}s -> {:8.3f}s  {:+6.1f}%'.format(
+                    stage, old_t, new_t, 100.0 * (new_t - old_t) / old_t))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='SVG to GCode pipeline benchmark')
+    arg_parser.add_argument('--preset', action='append', choices=sorted(PRESETS),
+                            help='document preset, may be repeated (default: small and medium)')
+    arg_parser.add_argument('--engine', action='append', choices=SvgPath.engines,
+                            help='flattening engine, may be repeated (default: numpy)')
+    for name in ('paths', 'curves', 'depth'):
+        arg_parser.add_argument('--' + name, type=int, help='override the preset ' + name)
+    for name in ('arcs', 'transforms', 'clones'):
+        arg_parser.add_argument('--' + name, type=float, help='override the preset ' + name + ' ratio')
+    arg_parser.add_argument('--flat', type=float, default=FLATNESS, help='flattening tolerance (mm)')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best is kept')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--output', help='write the results to this JSON file')
+    arg_parser.add_argument('--compare', help='JSON file of an earlier run to compare with')
+    arg_parser.add_argument('--save-svg', help='write the generated document of the first case here')
+    args = arg_parser.parse_args(argv)
+
+    result = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cases': {},
+    }
+    for preset in args.preset or ['small', 'medium']:
+        options = dict(PRESETS[preset])
+        for name in options:
+            if getattr(args, name) is not None:
+                options[name] = getattr(args, name)
+        if args.save_svg:
+            with open(args.save_svg, 'w') as f:
+                f.write(generate(seed=args.seed, **options))
+            args.save_svg = None
+        for engine in args.engine or ['numpy']:
+            case = benchmark(options, engine, args.repeat, args.flat, args.seed)
+            key = '{}/{}'.format(preset, engine)
+            result['cases'][key] = case
+            print('{}: {}'.format(key, ', '.join('{} {}'.format(v, k) for k, v in sorted(case['counts'].items()))))
+            print('  ' + ', '.join('{} {:.3f}s'.format(stage, case['timings'][stage]) for stage in STAGES + ('total',)))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    return result
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
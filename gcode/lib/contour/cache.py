@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import os
+import hashlib
+import numpy as np
+
+from .svg import SvgLayerChange, SvgPath, SvgPolylines
+
+# Bump when the flattening output changes, older entries are then ignored.
+CACHE_VERSION = 1
+
+# Max total size (bytes) of the cache directory.
+MAX_SIZE = 256 * 1024 * 1024
+
+
+class ToolpathCache(object):
+    """
+    On-disk cache of the flattened polylines of SVG documents, one .npz per
+    document: the points of all polylines, the end of each polyline and the
+    polyline count at each layer change. Least recently used entries are
+    evicted once the directory grows over [max_size] bytes.
+    """
+    def __init__(self, path, max_size=MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def key(svg_content, flat, page_scale):
+        """
+        Content address of a document flattened with the given tolerance and scale.
+        """
+        if not isinstance(svg_content, bytes):
+            svg_content = svg_content.encode('utf-8')
+        sha = hashlib.sha1(svg_content)
+        sha.update('|{}|{!r}|{!r}'.format(CACHE_VERSION, flat, page_scale).encode('utf-8'))
+        return sha.hexdigest()
+
+    def file_of(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def load(self, key):
+        """
+        Return the cached entities (SvgPolylines and SvgLayerChange) or None.
+        """
+        path = self.file_of(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                points = data['points']
+                ends = data['ends'].tolist()
+                layers = data['layers'].tolist()
+            os.utime(path, None)
+        except Exception as e:
+            print(e)
+            return None
+
+        entities = []
+        polylines = np.split(points, ends[:-1]) if ends else []
+        start = 0
+        for stop in layers:
+            if stop > start:
+                entities.append(SvgPolylines([p.tolist() for p in polylines[start:stop]]))
+            entities.append(SvgLayerChange(None))
+            start = stop
+        if start < len(polylines):
+            entities.append(SvgPolylines([p.tolist() for p in polylines[start:]]))
+        return entities
+
+    def save(self, key, entities):
+        """
+        Store the polylines of the entities, then evict old entries.
+        """
+        polylines = []
+        layers = []
+        for entity in entities:
+            if isinstance(entity, SvgPath):
+                polylines.extend(entity.segments)
+            elif isinstance(entity, SvgLayerChange):
+                layers.append(len(polylines))
+        points = np.array([point[:2] for points in polylines for point in points], dtype=float).reshape(-1, 2)
+        ends = np.cumsum([len(points) for points in polylines], dtype=np.int64)
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            path = self.file_of(key)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, points=points, ends=ends, layers=np.array(layers, dtype=np.int64))
+            os.replace(tmp_path, path)
+            self.evict()
+            return True
+        except Exception as e:
+            print(e)
+            return False
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_size.
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith('.npz'):
+                path = os.path.join(self.path, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except Exception as e:
+                print(e)
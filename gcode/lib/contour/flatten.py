@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+# Hard cap on the number of halvings applied to a single bezier. 2^-32 of a
+# curve is far below any useful tolerance, the cap only protects against
+# degenerate input (inf/huge coordinates) that would never become flat.
+MAX_DEPTH = 32
+
+# Number of path nodes collected by a FlattenBatch before it flushes.
+BATCH_SIZE = 200000
+
+
+def csp_to_array(cubic_super_path):
+    """
+    Convert a CubicSuperPath into a list of (n, 3, 2) float arrays,
+    one per subpath, each node being [ctrl in, point, ctrl out].
+    """
+    return [np.array(subpath, dtype=float).reshape(-1, 3, 2) for subpath in cubic_super_path]
+
+
+def subpath_beziers(nodes):
+    """
+    Build the (n - 1, 4, 2) array of cubic beziers joining the nodes
+    of a subpath: (point, ctrl out) of a node and (ctrl in, point) of the next.
+    """
+    return np.stack((nodes[:-1, 1], nodes[:-1, 2], nodes[1:, 0], nodes[1:, 1]), axis=1)
+
+
+def max_control_distance(beziers):
+    """
+    Compute for every bezier the max distance between its two control
+    points and the segment joining its end points (see ffgeom.Segment.distanceToPoint).
+    """
+    b0 = beziers[:, 0]
+    b3 = beziers[:, 3]
+    d = b3 - b0
+    c2 = np.einsum('ij,ij->i', d, d)
+    length = np.sqrt(c2)
+    result = None
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in (1, 2):
+            p = beziers[:, k]
+            v = p - b0
+            c1 = np.einsum('ij,ij->i', v, d)
+            perp = np.abs(d[:, 0] * (b0[:, 1] - p[:, 1]) - (b0[:, 0] - p[:, 0]) * d[:, 1]) / length
+            to_start = np.hypot(v[:, 0], v[:, 1])
+            to_end = np.hypot(p[:, 0] - b3[:, 0], p[:, 1] - b3[:, 1])
+            dist = np.where(c1 <= 0, to_start, np.where(c2 <= c1, to_end, perp))
+            result = dist if result is None else np.maximum(result, dist)
+    return result
+
+
+def split_beziers(beziers):
+    """
+    Split every bezier at t=0.5 (de Casteljau), return the two halves.
+    """
+    b0, b1, b2, b3 = beziers[:, 0], beziers[:, 1], beziers[:, 2], beziers[:, 3]
+    m1 = b0 + 0.5 * (b1 - b0)
+    m2 = b1 + 0.5 * (b2 - b1)
+    m3 = b2 + 0.5 * (b3 - b2)
+    m4 = m1 + 0.5 * (m2 - m1)
+    m5 = m2 + 0.5 * (m3 - m2)
+    m = m4 + 0.5 * (m5 - m4)
+    return np.stack((b0, m1, m4, m), axis=1), np.stack((m, m5, m3, b3), axis=1)
+
+
+def subdivide_beziers(beziers, flat, max_depth=MAX_DEPTH):
+    """
+    Subdivide all beziers in batches until each piece is flat within [flat].
+    Return the end point of every piece and the count of pieces per bezier,
+    ordered by bezier and then along the curve.
+    """
+    count = len(beziers)
+    owner = np.arange(count)
+    start = np.zeros(count)
+    width = 1.0
+
+    done_points = []
+    done_owner = []
+    done_start = []
+    active = beziers
+    for depth in range(max_depth + 1):
+        if not len(active):
+            break
+        # NaN distances are treated as flat, like the legacy "> flat" test
+        split = max_control_distance(active) > flat
+        if depth == max_depth:
+            split[:] = False
+        keep = ~split
+        done_points.append(active[keep, 3])
+        done_owner.append(owner[keep])
+        done_start.append(start[keep])
+
+        if not split.any():
+            break
+        width /= 2.0
+        left, right = split_beziers(active[split])
+        owner = np.concatenate((owner[split], owner[split]))
+        start = np.concatenate((start[split], start[split] + width))
+        active = np.concatenate((left, right))
+
+    points = np.concatenate(done_points) if done_points else np.empty((0, 2))
+    owner = np.concatenate(done_owner) if done_owner else np.empty(0, dtype=int)
+    start = np.concatenate(done_start) if done_start else np.empty(0)
+    order = np.lexsort((start, owner))
+    return points[order], np.bincount(owner, minlength=count)
+
+
+def flatten_cubic_super_path(cubic_super_path, flat):
+    """
+    Flatten a whole CubicSuperPath into one (n, 2) point array per subpath,
+    every subpath being subdivided in the same batch.
+    """
+    subpaths = csp_to_array(cubic_super_path)
+    return flatten_subpaths(subpaths, flat)
+
+
+def flatten_subpaths(subpaths, flat):
+    """
+    Flatten a list of (n, 3, 2) node arrays, see flatten_cubic_super_path.
+    """
+    beziers = [subpath_beziers(nodes) for nodes in subpaths if len(nodes) > 1]
+    if beziers:
+        points, counts = subdivide_beziers(np.concatenate(beziers), flat)
+        ends = np.cumsum(counts)
+    else:
+        points, ends = np.empty((0, 2)), np.empty(0, dtype=int)
+
+    polylines = []
+    first = 0
+    for nodes in subpaths:
+        n = len(nodes) - 1
+        if n <= 0:
+            polylines.append(nodes[:1, 1].copy())
+            continue
+        begin = ends[first - 1] if first else 0
+        polylines.append(np.concatenate((nodes[:1, 1], points[begin:ends[first + n - 1]])))
+        first += n
+    return polylines
+
+
+class FlattenBatch(object):
+    """
+    Collect the subpaths of many SvgPath entities and flatten them together,
+    so that the subdivision runs on large arrays instead of one path at a time.
+    The segments of an entity are only set once the batch has been flushed.
+    """
+    def __init__(self, flat, size=BATCH_SIZE):
+        self.flat = flat
+        self.size = size
+        self.pending = []
+        self.count = 0
+
+    def add(self, entity, subpaths):
+        """
+        Queue the (n, 3, 2) node arrays of an entity.
+        """
+        self.pending.append((entity, subpaths))
+        self.count += sum(len(nodes) for nodes in subpaths)
+        if self.count >= self.size:
+            self.flush()
+
+    def flush(self):
+        """
+        Flatten everything queued and fill in the segments of each entity.
+        """
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = []
+        self.count = 0
+
+        polylines = flatten_subpaths([nodes for _, subpaths in pending for nodes in subpaths], self.flat)
+        i = 0
+        for entity, subpaths in pending:
+            entity.segments = [points.tolist() for points in polylines[i:i + len(subpaths)]]
+            i += len(subpaths)
@@ -3,6 +3,8 @@
 import sys
 import numpy as np
 
+from . import toolpath
+
 
 class GCodeBuilder:
     """
@@ -22,6 +24,11 @@ class GCodeBuilder:
             'G0 X{x_home} Y{y_home} Z{z_home} F{moving_feedrate}'
         ]
 
+        # numeric copy of the program, kept in step with the commands
+        self.toolpath = toolpath.Toolpath() if options.get('toolpath', False) else None
+        if self.toolpath is not None:
+            self.toolpath.append(toolpath.HOME)
+
     def start(self):
         """
         Start drawing.
@@ -51,6 +58,9 @@ class GCodeBuilder:
             self.codes.append(cmd)
             cmd = 'G0 Z{z_offset} F{moving_feedrate}'
             self.codes.append(cmd)
+            if self.toolpath is not None:
+                self.toolpath.append(toolpath.TRAVEL, y, -x)
+                self.toolpath.append(toolpath.PEN_DOWN)
 
         self.last = (x, y)
 
@@ -66,9 +76,55 @@ class GCodeBuilder:
         cmd = 'G1 X{0:.2f} Y{1:.2f}'.format(y, -x)
         cmd += ' F{drawing_feedrate}'
         self.codes.append(cmd)
+        if self.toolpath is not None:
+            self.toolpath.append(toolpath.DRAW, y, -x)
 
         self.last = (x, y)
 
+    def draw_arc(self, x, y, cx, cy, clockwise):
+        """
+        Draw an arc to a certain point around the center (cx, cy).
+        """
+        if self.last == (x, y):
+            return
+
+        if self.drawing is False:
+            self.start()
+        x0, y0 = self.last[0], self.last[1]
+        # the machine frame is the SVG frame turned by -90 degrees (see
+        # draw_to_point), which keeps the arc direction
+        i, j = cy - y0, -(cx - x0)
+        cmd = '{0} X{1:.2f} Y{2:.2f} I{3:.2f} J{4:.2f}'.format('G2' if clockwise else 'G3', y, -x, i, j)
+        cmd += ' F{drawing_feedrate}'
+        self.codes.append(cmd)
+        if self.toolpath is not None:
+            self.toolpath.append(toolpath.ARC_CW if clockwise else toolpath.ARC_CCW, y, -x, i, j)
+
+        self.last = (x, y)
+
+    def draw_path(self, points, moves):
+        """
+        Draw a polyline given as its first point and the line/arc moves
+        of arcs.fit_arcs, closed like draw_polyline.
+        """
+        start = points[0]
+
+        self.go_to_point(start[0], start[1])
+        self.start()
+
+        for move in moves:
+            if move[0] == 'arc':
+                self.draw_arc(*move[1:])
+            else:
+                self.draw_to_point(move[1], move[2])
+        self.draw_to_point(start[0], start[1])
+
+        cmd = 'G0 Z{z_offset_pen_up} F{moving_feedrate}'
+        self.codes.append(cmd)
+        if self.toolpath is not None:
+            self.toolpath.append(toolpath.PEN_UP)
+        self.stop()
+
     def draw_polyline(self, points):
         """
         Draw a polyline (series of points).
@@ -85,8 +141,41 @@ class GCodeBuilder:
 
         cmd = 'G0 Z{z_offset_pen_up} F{moving_feedrate}'
         self.codes.append(cmd)
+        if self.toolpath is not None:
+            self.toolpath.append(toolpath.PEN_UP)
         self.stop()
 
+    def pop_codes(self):
+        """
+        Return the commands added since the last call and forget them.
+        """
+        codes = self.codes
+        self.codes = []
+        return codes
+
+    def template_values(self):
+        """
+        Values substituted in the GCode template.
+        """
+        return dict(
+            x_home=self.config.get('x_home', 150),
+            y_home=self.config.get('y_home', 0),
+            z_home=self.config.get('z_home', 90),
+            z_offset=self.config.get('z_offset', 90),
+            z_offset_pen_up=self.config.get('z_offset', 90) + self.config.get('pen_up', 0),
+            moving_feedrate=self.config.get('moving_feedrate', 1000),
+            drawing_feedrate=self.config.get('drawing_feedrate', 150),
+        )
+
+    def render(self, commands):
+        """
+        Join commands into GCode, keeping the template if return_template is set.
+        """
+        if self.config.get('return_template', False):
+            return '\n'.join(commands)
+        else:
+            return '\n'.join(commands).format(**self.template_values())
+
     def build(self):
         """
         Build complete GCode and return as string. 
@@ -95,15 +184,36 @@ class GCodeBuilder:
         commands.extend(self.preamble)
         commands.extend(self.codes)
         commands.extend(self.sheet_footer)
-        if self.config.get('return_template', False):
-            return '\n'.join(commands)
-        else:
-            return '\n'.join(commands).format(
-                x_home=self.config.get('x_home', 150),
-                y_home=self.config.get('y_home', 0),
-                z_home=self.config.get('z_home', 90),
-                z_offset=self.config.get('z_offset', 90),
-                z_offset_pen_up=self.config.get('z_offset', 90) + self.config.get('pen_up', 0),
-                moving_feedrate=self.config.get('moving_feedrate', 1000),
-                drawing_feedrate=self.config.get('drawing_feedrate', 150),
-            )
+        if self.toolpath is not None:
+            self.toolpath.append(toolpath.HOME)
+            self.toolpath.freeze()
+        return self.render(commands)
+
+
+def transform_lines(lines, scale, x_offset, y_offset, moving_feedrate, drawing_feedrate):
+    """
+    Scale and offset the X/Y of GCode text lines and set their feedrates,
+    the text counterpart of toolpath.Toolpath.transform. Return new lines.
+    """
+    result = []
+    for line in lines:
+        List = line.strip().split(' ')
+        line = ''
+        for l in List:
+            if l.startswith('F'):
+                if line.startswith(('G01', 'G1', 'G02', 'G2', 'G03', 'G3')):
+                    l = 'F{}'.format(drawing_feedrate)
+                elif line.startswith(('G00', 'G0')):
+                    l = 'F{}'.format(moving_feedrate)
+            elif l.startswith('X'):
+                x = float(l[1:]) * scale + x_offset
+                l = 'X{0:.2f}'.format(x)
+            elif l.startswith('Y'):
+                y = float(l[1:]) * scale + y_offset
+                l = 'Y{0:.2f}'.format(y)
+            elif l.startswith(('I', 'J')):
+                # arc center offsets are only scaled
+                l = '{0}{1:.2f}'.format(l[0], float(l[1:]) * scale)
+            line += l + ' '
+        result.append(line.strip())
+    return result
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+
+import math
+import time
+import numpy as np
+
+# Entry points per cell of the GridIndex, closest entry points listed for
+# every entry point, pairs compared at most per cell to list them (those of
+# crowded cells get no list), and grid rings searched once a list is taken.
+CELL_POINTS = 3
+NEIGHBOURS = 12
+MAX_PAIRS = 256
+MAX_RING = 3
+# Number of following tour positions tried for every 2-opt move.
+TWO_OPT_WINDOW = 16
+TWO_OPT_PASSES = 8
+# 2-opt stops once a pass shortens the tour by less than this ratio.
+TWO_OPT_MIN_GAIN = 0.002
+
+
+def entry_points(polylines):
+    """
+    Entry point (first vertex) of every polyline as an (n, 2) array.
+    """
+    if not polylines:
+        return np.empty((0, 2))
+    return np.array([points[0][:2] for points in polylines], dtype=float)
+
+
+def travel_distance(polylines):
+    """
+    Total pen-up distance to draw the polylines in order.
+
+    GCodeBuilder.draw_polyline always closes a polyline back to its first
+    vertex, so the pen leaves each polyline where it entered it.
+    """
+    return path_length(entry_points(polylines))
+
+
+def path_length(points):
+    """
+    Length of the path through an (n, 2) array of points in order.
+    """
+    if len(points) < 2:
+        return 0.0
+    return float(np.hypot(*np.diff(points, axis=0).T).sum())
+
+
+def is_closed(points):
+    return len(points) > 2 and points[0][0] == points[-1][0] and points[0][1] == points[-1][1]
+
+
+def last_points(polylines):
+    """
+    Last vertex of every polyline as an (n, 2) array.
+    """
+    if not polylines:
+        return np.empty((0, 2))
+    return np.array([points[-1][:2] for points in polylines], dtype=float)
+
+
+def closed_mask(polylines, starts, ends):
+    """
+    is_closed of every polyline, from their entry_points and last_points.
+    """
+    lengths = np.fromiter(map(len, polylines), dtype=np.int64, count=len(polylines))
+    return (lengths > 2) & (starts == ends).all(axis=1)
+
+
+def column_ranges(keys, starts, length):
+    """
+    Indices of the sorted [keys] in [start, start + length) for every start
+    of [starts], as one array.
+    """
+    lo = np.searchsorted(keys, starts)
+    counts = np.searchsorted(keys, starts + length) - lo
+    return np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(int(counts.sum()))
+
+
+class GridIndex(object):
+    """
+    Nearest neighbour queries over candidate entry points. Identical points
+    are grouped in sites, numbered in the order of a uniform grid of about
+    CELL_POINTS sites per cell, column by column: the sites of a block of
+    cells are a few ranges of indices. Every site lists its closest sites,
+    computed at once with numpy (see neighbour_lists), so a query mostly
+    walks a short list; once the whole list is taken, the block of cells
+    around the site is searched (vectorized), then all the sites.
+    Each candidate belongs to a polyline, taking one removes all candidates
+    of that polyline.
+    """
+    def __init__(self, points, owners):
+        self.points = points
+        self.owners = owners.tolist()
+        self.alive = bytearray(b'\x01') * len(points)
+        order = np.lexsort((points[:, 1], points[:, 0]))
+        ordered = points[order]
+        new = np.ones(len(points), dtype=bool)
+        new[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+        site_of = np.empty(len(points), dtype=np.int64)
+        site_of[order] = np.cumsum(new) - 1
+        sites = ordered[new]
+        keys = self.build_grid(sites)
+        # renumber the sites by cell
+        by_cell = np.argsort(keys, kind='stable')
+        rank = np.empty(len(sites), dtype=np.int64)
+        rank[by_cell] = np.arange(len(sites))
+        self.keys = keys[by_cell]
+        self.sites = sites[by_cell]
+        self.xs = np.ascontiguousarray(self.sites[:, 0])
+        self.ys = np.ascontiguousarray(self.sites[:, 1])
+        site_of = rank[site_of]
+        self.site_of = site_of.tolist()
+        # candidates of every site, lowest index first, and the first one
+        # maybe alive
+        members = np.argsort(site_of, kind='stable')
+        self.members = members.tolist()
+        self.first = np.searchsorted(site_of[members], np.arange(len(sites))).tolist()
+        self.left = np.bincount(site_of, minlength=len(sites)).tolist()
+        # candidates of every owner
+        candidates = np.argsort(owners, kind='stable')
+        self.candidates = candidates.tolist()
+        self.owner_bounds = np.searchsorted(owners[candidates], np.arange(int(owners.max()) + 2)).tolist()
+        # sites with alive candidates, for the vectorized searches; those of
+        # the exhaustive scan are compacted as they get taken
+        self.mask = np.ones(len(sites), dtype=bool)
+        self.pool = np.arange(len(sites))
+        self.pool_points = self.sites
+        self.neighbour_lists()
+
+    def build_grid(self, sites):
+        """
+        Cell size and column width of the grid, return the cell key of
+        every site.
+        """
+        n = len(sites)
+        lo = sites.min(axis=0)
+        hi = sites.max(axis=0)
+        area = max((hi[0] - lo[0]) * (hi[1] - lo[1]), 1e-12)
+        size = max(math.sqrt(CELL_POINTS * area / n), 1e-6)
+        # shrink the cells until a site shares its cell with about
+        # CELL_POINTS others, clustered drawings would otherwise pile up
+        # hundreds per cell
+        for _ in range(8):
+            cells = np.floor((sites - lo) / size).astype(np.int64)
+            counts = np.unique(cells[:, 0] * (int(cells[:, 1].max()) + 1) + cells[:, 1], return_counts=True)[1]
+            occupancy = float((counts * counts).sum()) / n
+            if occupancy <= 1.5 * CELL_POINTS:
+                break
+            size = max(size / math.sqrt(occupancy / CELL_POINTS), 1e-6)
+        self.size = size
+        # a border of MAX_RING empty cells, the cells around a site never
+        # wrap to the next column
+        self.width = int(cells[:, 1].max()) + 1 + 2 * MAX_RING
+        return (cells[:, 0] + MAX_RING) * self.width + cells[:, 1] + MAX_RING
+
+    def block(self, key, ring):
+        """
+        Sites of the cells at most [ring] cells away from the cell [key].
+        """
+        columns = key + self.width * np.arange(-ring, ring + 1) - ring
+        return column_ranges(self.keys, columns, 2 * ring + 1)
+
+    def neighbour_lists(self, count=NEIGHBOURS):
+        """
+        For every site, up to [count] other sites by increasing distance, in
+        near[near_start[site]:near_start[site + 1]]: the sites of the 3x3
+        cells around it closer than a cell size, so the closest sites indeed.
+        Sites of crowded cells get no list.
+        """
+        n = len(self.sites)
+        size = self.size
+        keys = self.keys
+        # the cells
+        new = np.diff(keys, prepend=keys[0] - 1) != 0
+        cell_keys = keys[new]
+        cell_of = np.cumsum(new) - 1
+        # sites of the 3x3 cells around every cell: three ranges of keys
+        columns = (cell_keys[:, None] + self.width * np.arange(-1, 2) - 1).ravel()
+        lo = np.searchsorted(keys, columns)
+        counts = np.searchsorted(keys, columns + 3) - lo
+        per_cell = counts.reshape(-1, 3).sum(axis=1)
+        counts.reshape(-1, 3)[per_cell > MAX_PAIRS] = 0
+        per_cell[per_cell > MAX_PAIRS] = 0
+        block = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(int(counts.sum()))
+        # (site, site of its block) pairs, grouped by site
+        per_site = per_cell[cell_of]
+        src = np.repeat(np.arange(n), per_site)
+        block_start = np.cumsum(per_cell) - per_cell
+        dst = block[np.repeat(block_start[cell_of] - (np.cumsum(per_site) - per_site), per_site) +
+                    np.arange(len(src))]
+        dx = self.xs[dst] - self.xs[src]
+        dy = self.ys[dst] - self.ys[src]
+        d = dx * dx + dy * dy
+        # distinct sites: only a site is at 0 from itself
+        keep = np.flatnonzero((d <= size * size) & (d > 0))
+        src, dst, d = src[keep], dst[keep], d[keep]
+        # by site then distance, as one key: d / size^2 is at most 1
+        ranked = np.argsort(src + d / (2.0 * size * size), kind='stable')
+        src, dst = src[ranked], dst[ranked]
+        keep = np.arange(len(src)) - np.searchsorted(src, src) < count
+        src, dst = src[keep], dst[keep]
+        self.near = dst.tolist()
+        self.near_start = np.searchsorted(src, np.arange(n + 1)).tolist()
+
+    def remove_owner(self, owner):
+        for i in range(self.owner_bounds[owner], self.owner_bounds[owner + 1]):
+            index = self.candidates[i]
+            if self.alive[index]:
+                self.alive[index] = 0
+                site = self.site_of[index]
+                self.left[site] -= 1
+                if not self.left[site]:
+                    self.mask[site] = False
+
+    def take(self, site):
+        """
+        Alive candidate of [site] with the lowest index.
+        """
+        members = self.members
+        i = self.first[site]
+        while not self.alive[members[i]]:
+            i += 1
+        self.first[site] = i
+        return members[i]
+
+    def nearest(self, site):
+        """
+        Closest site to [site] having alive candidates: [site] itself, then
+        the first alive of its list, else the closest of the MAX_RING block
+        of cells around it, else the closest of all (scan).
+        """
+        left = self.left
+        if left[site]:
+            return site
+        near = self.near
+        for i in range(self.near_start[site], self.near_start[site + 1]):
+            if left[near[i]]:
+                return near[i]
+        found = self.block(self.keys[site], MAX_RING)
+        found = found[self.mask[found]]
+        if len(found):
+            d = (self.xs[found] - self.xs[site]) ** 2 + (self.ys[found] - self.ys[site]) ** 2
+            k = int(np.argmin(d))
+            # no site beyond the block is closer
+            if d[k] <= (MAX_RING * self.size) ** 2:
+                return int(found[k])
+        return self.scan(site)
+
+    def scan(self, site):
+        """
+        Alive site closest to [site], checking them all.
+        """
+        alive = self.mask[self.pool]
+        if 2 * np.count_nonzero(alive) < len(alive):
+            self.pool = self.pool[alive]
+            self.pool_points = self.pool_points[alive]
+            alive = alive[alive]
+        d = (self.pool_points[:, 0] - self.xs[site]) ** 2 + (self.pool_points[:, 1] - self.ys[site]) ** 2
+        d[~alive] = np.inf
+        return int(self.pool[np.argmin(d)])
+
+
+def nearest_neighbour_order(polylines, reverse=False, starts=None):
+    """
+    Greedy tour: always draw next the polyline whose entry is the closest.
+    With [reverse], open polylines may also be entered by their last vertex.
+    [starts] are the entry points of the polylines, if already known.
+    Return (order, reversed flags).
+    """
+    count = len(polylines)
+    if starts is None:
+        starts = entry_points(polylines)
+    points = [starts]
+    owners = [np.arange(count)]
+    if reverse:
+        ends = last_points(polylines)
+        lengths = np.fromiter(map(len, polylines), dtype=np.int64, count=count)
+        open_lines = np.flatnonzero((lengths > 1) & ~closed_mask(polylines, starts, ends))
+        if len(open_lines):
+            points.append(ends[open_lines])
+            owners.append(open_lines)
+    points = np.concatenate(points)
+    owners = np.concatenate(owners)
+
+    index = GridIndex(points, owners)
+    order = []
+    ends = []
+    candidate = 0
+    for k in range(count):
+        if k:
+            candidate = index.take(index.nearest(site))
+        owner = index.owners[candidate]
+        order.append(owner)
+        ends.append(candidate)
+        index.remove_owner(owner)
+        site = index.site_of[candidate]
+    order = np.array(order, dtype=np.int64)
+    flipped = np.zeros(count, dtype=bool)
+    flipped[order] = np.array(ends) >= count
+    return order, flipped
+
+
+def two_opt(entries, order, window=TWO_OPT_WINDOW, passes=TWO_OPT_PASSES, min_gain=TWO_OPT_MIN_GAIN):
+    """
+    Improve an open tour of entry points with 2-opt moves between positions
+    less than [window] apart. All candidate moves of a pass are evaluated
+    at once, the best non-overlapping improving ones are then applied.
+    """
+    order = order.copy()
+    n = len(order)
+    if n < 4:
+        return order
+    for _ in range(passes):
+        x = entries[order, 0]
+        y = entries[order, 1]
+        best_gain = np.zeros(n)
+        best_j = np.zeros(n, dtype=np.int64)
+        # reversing order[i + 1:j + 1] replaces edges (i, i + 1) and (j, j + 1)
+        # by (i, j) and (i + 1, j + 1); the last position has no outgoing edge
+        edge = np.append(np.hypot(np.diff(x), np.diff(y)), 0.0)
+        x1 = np.append(x, x[-1])
+        y1 = np.append(y, y[-1])
+        for offset in range(2, min(window, n - 1) + 1):
+            m = n - offset
+            new = np.hypot(x[:m] - x[offset:], y[:m] - y[offset:]) + \
+                np.hypot(x[1:m + 1] - x1[offset + 1:], y[1:m + 1] - y1[offset + 1:])
+            # the (i + 1, j + 1) edge does not exist when j is the last position
+            new[-1] = math.hypot(x[m - 1] - x[n - 1], y[m - 1] - y[n - 1])
+            gain = edge[:m] + edge[offset:] - new
+            better = gain > best_gain[:m] + 1e-9
+            best_gain[:m][better] = gain[better]
+            best_j[:m][better] = offset + np.flatnonzero(better)
+
+        moves = np.flatnonzero(best_gain > 1e-9)
+        if not len(moves):
+            break
+        moves = moves[np.argsort(-best_gain[moves])]
+        used = bytearray(n + 1)
+        ends = best_j.tolist()
+        taken = []
+        for i in moves.tolist():
+            j = ends[i]
+            if any(used[i:j + 2]):
+                continue
+            used[i:j + 2] = b'\x01' * (j + 2 - i)
+            taken.append((i, j))
+        for i, j in taken:
+            order[i + 1:j + 1] = order[i + 1:j + 1][::-1].copy()
+        gained = best_gain[[i for i, _ in taken]].sum()
+        if gained < min_gain * edge.sum():
+            break
+    return order
+
+
+def reseam_closed(polylines, starts=None):
+    """
+    Rotate every closed polyline so that it starts at the vertex minimizing
+    the travel from the previous polyline and to the next one.
+    [starts] are the entry points of the polylines, if already known; they
+    are updated along.
+    """
+    count = len(polylines)
+    if starts is None:
+        starts = entry_points(polylines)
+    closed = np.flatnonzero(closed_mask(polylines, starts, last_points(polylines))).tolist()
+    if not closed:
+        return polylines
+    polylines = list(polylines)
+    # even then odd positions, so that the neighbours of a polyline are fixed
+    for parity in (0, 1):
+        for i in closed:
+            if i % 2 != parity:
+                continue
+            points = np.asarray(polylines[i], dtype=float)[:-1, :2]
+            cost = np.zeros(len(points))
+            if i > 0:
+                cost += np.hypot(*(points - starts[i - 1]).T)
+            if i + 1 < count:
+                cost += np.hypot(*(points - starts[i + 1]).T)
+            k = int(np.argmin(cost))
+            if k and cost[k] < cost[0]:
+                line = polylines[i]
+                polylines[i] = line[k:] + line[1:k + 1] if isinstance(line, list) else \
+                    np.concatenate((line[k:], line[1:k + 1]))
+                starts[i] = points[k]
+    return polylines
+
+
+def optimize_travel(polylines, reverse=False, improve=True):
+    """
+    Reorder polylines to shorten the pen-up moves between them:
+    nearest neighbour over a grid index, then windowed 2-opt. With [reverse],
+    open polylines may be drawn backwards and closed ones re-seamed.
+    Return (polylines, stats) where stats holds the travel before and after.
+    """
+    t0 = time.time()
+    polylines = [points for points in polylines if len(points)]
+    starts = entry_points(polylines)
+    before = path_length(starts)
+    if len(polylines) > 2:
+        order, flipped = nearest_neighbour_order(polylines, reverse=reverse, starts=starts)
+        result = [polylines[i][::-1] if flipped[i] else polylines[i] for i in order.tolist()]
+        # entry points of the result, kept along instead of collected again
+        entries = starts[order]
+        backwards = np.flatnonzero(flipped[order])
+        if len(backwards):
+            entries[backwards] = [result[i][0][:2] for i in backwards.tolist()]
+        if improve:
+            order = two_opt(entries, np.arange(len(result)))
+            result = [result[i] for i in order.tolist()]
+            entries = entries[order]
+        if reverse:
+            result = reseam_closed(result, entries)
+        after = path_length(entries)
+        if after > before:
+            result, after = polylines, before
+    else:
+        result, after = polylines, before
+    return result, {
+        'travel_before': before,
+        'travel_after': after,
+        'polylines': len(polylines),
+        'time': time.time() - t0,
+    }
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+from . import flatten
+from . import pathdata
+
+# Below this number of paths the flattening stays in the current process,
+# starting the worker processes would cost more than it saves.
+MIN_PARALLEL_JOBS = 500
+
+# Number of paths sent to a worker process at once.
+CHUNK_SIZE = 500
+
+# Number of paths collected by a ParallelBatch before it flushes.
+BATCH_SIZE = 20000
+
+
+def parse_path(d, node_transform):
+    """
+    Parse a path "d" attribute into its (n, 3, 2) node arrays, transformed.
+    """
+    return pathdata.parse_nodes(d, node_transform)
+
+
+def flatten_chunk(jobs, flat):
+    """
+    Flatten a list of (d, transform) jobs, return the segments of each job.
+    Runs in the worker processes, so it must stay a module level function.
+    """
+    paths = [parse_path(d, node_transform) for d, node_transform in jobs]
+    polylines = flatten.flatten_subpaths([nodes for subpaths in paths for nodes in subpaths], flat)
+    segments = []
+    i = 0
+    for subpaths in paths:
+        segments.append([points.tolist() for points in polylines[i:i + len(subpaths)]])
+        i += len(subpaths)
+    return segments
+
+
+class ParallelBatch(object):
+    """
+    Collect the (d, transform) of many SvgPath entities and flatten them
+    across a process pool, chunk by chunk in document order.
+    The segments of an entity are only set once the batch has been flushed.
+    The pool is started at the first parallel flush and kept for the next
+    ones until close, its workers are spawned rather than forked.
+    """
+    def __init__(self, flat, workers=None, chunk_size=CHUNK_SIZE, size=BATCH_SIZE):
+        self.flat = flat
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.size = size
+        self.pending = []
+        self.executor = None
+
+    def add(self, entity, d, node_transform):
+        self.pending.append((entity, (d, node_transform)))
+        if len(self.pending) >= self.size:
+            self.flush()
+
+    def flush(self):
+        """
+        Flatten everything queued and fill in the segments of each entity.
+        """
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = []
+
+        jobs = [job for _, job in pending]
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        if len(jobs) < MIN_PARALLEL_JOBS or self.workers == 1:
+            results = [flatten_chunk(chunk, self.flat) for chunk in chunks]
+        else:
+            results = list(self.pool().map(flatten_chunk, chunks, [self.flat] * len(chunks)))
+
+        entities = iter(entity for entity, _ in pending)
+        for segments in results:
+            # segments first, zip would otherwise drop an entity per chunk
+            for entity_segments, entity in zip(segments, entities):
+                entity.segments = entity_segments
+
+    def pool(self):
+        if self.executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # the batch runs in a QThread of the UI: a forked child would get
+            # copies of the locks other threads hold, spawn starts clean ones
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def close(self):
+        """
+        Stop the worker processes, the paths still queued are dropped.
+        """
+        self.pending = []
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import io
 import os
 import six
 if six.PY2:
@@ -11,19 +12,53 @@ if six.PY3:
 else:
     from StringIO import StringIO
 
+from .arcs import fit_arcs
 from .gcode import GCodeBuilder
-from .svg import SvgLayerChange, SvgParser, SvgPath
+from .optimize import optimize_travel
+from .simplify import iter_simplified
+from .stream import StreamSvgParser
+from .svg import FLATNESS, PAGE_SCALE, SvgLayerChange, SvgParser, SvgPath
 
 
 class SVGParser(object):
     def __init__(self, *args, **kwargs):
         self.svg_path = kwargs.get('svg_path', None)
         self.gcode_path = kwargs.get('gcode_path', None)
+        # flattening engine of SvgPath, 'numpy' or 'legacy'
+        self.engine = kwargs.get('engine', 'numpy')
+        # flatten the paths across a process pool (numpy engine only)
+        self.parallel = kwargs.get('parallel', False)
+        self.workers = kwargs.get('workers', None)
+        # flattening tolerance (mm) of the curves
+        self.flat = kwargs.get('flat', None) or FLATNESS
+        # drop the points closer than this (mm) to the simplified polylines, 0 to disable
+        self.simplify = kwargs.get('simplify', 0)
+        # replace the runs of points within this (mm) of a circle by G2/G3 arcs, 0 to disable
+        self.arcs = kwargs.get('arcs', 0)
+        # read the SVG with lxml iterparse instead of building the whole tree
+        self.streaming = kwargs.get('streaming', False)
+        # cache.ToolpathCache of flattened polylines, skips SvgParser on a hit
+        self.cache = kwargs.get('cache', None)
+        # reorder the polylines of each layer to shorten the pen-up moves
+        self.optimize_travel = kwargs.get('optimize_travel', False)
+        # let the optimizer draw open polylines backwards
+        self.reverse = kwargs.get('reverse', False)
+        self.stats = {}
+        self.cancelled = False
         self.__gcode = GCodeBuilder(kwargs)
+        # numeric program filled by convert() when the toolpath option is set
+        self.toolpath = self.__gcode.toolpath
 
-    def convert(self, svg_content):
+    def cancel(self):
+        """
+        Stop a conversion running in another thread, convert() then returns None.
+        """
+        self.cancelled = True
+
+    def convert(self, svg_content, progress=None):
         """
         Setup GCode writer and SVG parser.
+        [progress] is called with (done, total) after each SVG entity.
         """
         # self.__gcode.codes = []
         if self.svg_path:
@@ -32,12 +67,31 @@ class SVGParser(object):
                 os.makedirs(svg_dir)
             self.write_svg_to_file(svg_content, self.svg_path)
 
-        document = self.parse_xml(svg_content)
-        parser = SvgParser(document)
-        parser.parse()
+        cached = None
+        parser = None
+        if self.cache is not None:
+            key = self.cache.key(svg_content, self.flat, PAGE_SCALE)
+            cached = self.cache.load(key)
+        if cached is not None:
+            entities = self.iter_progress(cached, len(cached), progress)
+            collected = None
+        else:
+            parser = self.make_parser(svg_content)
+            entities = self.iter_progress(parser.iter_entities(), parser.count_entities(), progress)
+            collected = []
+            if self.cache is not None:
+                entities = self.iter_collect(entities, collected)
         # map(self.process_svg_entity, parser.entities)
-        for entity in parser.entities:
-            self.process_svg_entity(entity)
+        for points in self.iter_polylines(entities):
+            self.draw(self.__gcode, points)
+        if parser is not None:
+            # stops the worker processes of a cancelled parse right away
+            parser.close()
+        if self.cancelled:
+            return None
+        self.stats['cache_hit'] = cached is not None
+        if self.cache is not None and cached is None:
+            self.cache.save(key, collected)
 
         output = self.__gcode.build()
         if self.gcode_path:
@@ -47,6 +101,67 @@ class SVGParser(object):
             self.write_gcode_to_file(output, self.gcode_path)
         return output
 
+    def iter_convert(self, svg_content):
+        """
+        Convert lazily, yielding the GCode lines as each SVG entity is processed.
+        The preamble is yielded before the SVG is even parsed.
+        """
+        gcode = self.__gcode
+        for line in gcode.render(gcode.preamble).split('\n'):
+            yield line
+
+        parser = self.make_parser(svg_content)
+        for points in self.iter_polylines(parser.iter_entities()):
+            self.draw(gcode, points)
+            codes = gcode.pop_codes()
+            if codes:
+                for line in gcode.render(codes).split('\n'):
+                    yield line
+
+        for line in gcode.render(gcode.sheet_footer).split('\n'):
+            yield line
+
+    def convert_to_stream(self, svg_content, output, chunk_size=65536):
+        """
+        Convert and write the GCode to [output] in chunks of about [chunk_size]
+        bytes, so the whole program is never held in memory.
+        [output] is a path, a socket (sendall) or a text/binary file-like object (write).
+        Return the number of lines written.
+        """
+        if isinstance(output, six.string_types):
+            with open(output, 'wb') as f:
+                return self.convert_to_stream(svg_content, f, chunk_size=chunk_size)
+
+        if hasattr(output, 'sendall'):
+            send = output.sendall
+            binary = True
+        else:
+            send = output.write
+            binary = not isinstance(output, io.TextIOBase)
+
+        count = 0
+        chunk = []
+        size = 0
+        for line in self.iter_convert(svg_content):
+            chunk.append(line)
+            size += len(line) + 1
+            count += 1
+            if size >= chunk_size:
+                self._send_chunk(send, chunk, binary)
+                chunk = []
+                size = 0
+        self._send_chunk(send, chunk, binary)
+        return count
+
+    @staticmethod
+    def _send_chunk(send, lines, binary):
+        if not lines:
+            return
+        data = '\n'.join(lines) + '\n'
+        if binary and not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        send(data)
+
     @staticmethod
     def write_svg_to_file(data, path):
         if six.PY3:
@@ -73,6 +188,17 @@ class SVGParser(object):
             print(e)
             return False
 
+    def make_parser(self, svg_content):
+        """
+        SvgParser of the document, a StreamSvgParser with the streaming option.
+        """
+        options = dict(engine=self.engine, parallel=self.parallel, workers=self.workers, flat=self.flat)
+        if self.streaming:
+            if isinstance(svg_content, bytes):
+                return StreamSvgParser(io.BytesIO(svg_content), **options)
+            return StreamSvgParser(io.BytesIO(svg_content.encode('utf-8')), encoding='utf-8', **options)
+        return SvgParser(self.parse_xml(svg_content), **options)
+
     @staticmethod
     def parse_xml(xml_content):
         """
@@ -89,6 +215,85 @@ class SVGParser(object):
 
         return document
 
+    def iter_progress(self, entities, total, progress=None):
+        """
+        Pass the entities through, reporting progress and stopping early
+        once the conversion is cancelled.
+        """
+        done = 0
+        for entity in entities:
+            if self.cancelled:
+                return
+            if isinstance(entity, SvgPath):
+                done += 1
+                if progress is not None:
+                    progress(done, max(done, total))
+            yield entity
+
+    @staticmethod
+    def iter_collect(entities, collected):
+        """
+        Pass the entities through, keeping them in [collected].
+        """
+        for entity in entities:
+            collected.append(entity)
+            yield entity
+
+    def draw(self, gcode, points):
+        """
+        Draw a polyline, with arcs where they fit when the arcs option is set.
+        """
+        if self.arcs > 0:
+            # the closing move is fitted too, the polyline is drawn closed
+            moves = fit_arcs(list(points) + [points[0]], self.arcs)
+            count = sum(1 for move in moves if move[0] == 'arc')
+            if count:
+                self.stats['arcs'] += count
+                gcode.draw_path(points, moves)
+                return
+        gcode.draw_polyline(points)
+
+    def iter_polylines(self, entities):
+        """
+        Yield the polylines to draw, in drawing order. With optimize_travel
+        the polylines of each layer are collected and reordered together.
+        """
+        self.stats = {'travel_before': 0.0, 'travel_after': 0.0, 'polylines': 0, 'points': 0, 'removed': 0,
+                      'arcs': 0, 'time': 0.0}
+        if self.simplify > 0:
+            entities = iter_simplified(entities, self.simplify, self.stats)
+        for points in self._iter_ordered(entities):
+            self.stats['polylines'] += 1
+            self.stats['points'] += len(points)
+            yield points
+
+    def _iter_ordered(self, entities):
+        if not self.optimize_travel:
+            for entity in entities:
+                if isinstance(entity, SvgPath):
+                    for points in entity.segments:
+                        yield points
+            return
+
+        layer = []
+        for entity in entities:
+            if isinstance(entity, SvgPath):
+                layer.extend(entity.segments)
+            elif isinstance(entity, SvgLayerChange):
+                for points in self._optimize_layer(layer):
+                    yield points
+                layer = []
+        for points in self._optimize_layer(layer):
+            yield points
+
+    def _optimize_layer(self, polylines):
+        if not polylines:
+            return []
+        polylines, stats = optimize_travel(polylines, reverse=self.reverse)
+        for key in ('travel_before', 'travel_after', 'time'):
+            self.stats[key] += stats[key]
+        return polylines
+
     def process_svg_entity(self, svg_entity):
         """
         Generate GCode for a given SVG entity.
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+import re
+import numpy as np
+
+from . import transform
+from .svglib import cubicsuperpath
+
+# Path data is split into tokens in one findall; numbers and commands are
+# then separated with a few list passes instead of a loop over match objects.
+TOKEN = re.compile(r'[MLHVCSQTAZmlhvcsqtaz]|[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?')
+SEPARATORS = ' \t\r\n,'
+
+# command -> (number of parameters, implicit next command)
+COMMANDS = {
+    'M': (2, 'L'),
+    'L': (2, 'L'),
+    'H': (1, 'H'),
+    'V': (1, 'V'),
+    'C': (6, 'C'),
+    'S': (4, 'S'),
+    'Q': (4, 'Q'),
+    'T': (2, 'T'),
+    'A': (7, 'A'),
+    'Z': (0, 'L'),
+}
+COMMANDS.update(dict((command.lower(), (count, implicit.lower()))
+                     for command, (count, implicit) in list(COMMANDS.items())))
+
+
+def lex_path(d):
+    """
+    Split path data into (commands, numbers): every command with the index
+    of its first number, and all the numbers as floats.
+    """
+    tokens = TOKEN.findall(d)
+    # anything the tokens do not cover, separators aside, is invalid
+    if sum(map(len, tokens)) + sum(d.count(c) for c in SEPARATORS) != len(d):
+        raise Exception('Invalid path data!')
+    positions = [i for i, token in enumerate(tokens) if token in COMMANDS]
+    numbers = list(map(float, [token for token in tokens if token not in COMMANDS]))
+    commands = [(tokens[position], position - k) for k, position in enumerate(positions)]
+    return commands, numbers
+
+
+def iter_commands(commands, numbers):
+    """
+    Yield (command, params) for every command of the path, the implicit
+    commands of repeated parameter sets included.
+    """
+    if not commands:
+        if numbers:
+            raise Exception('Invalid path, no initial command.')
+        return
+    if commands[0][0] not in 'Mm' or commands[0][1]:
+        raise Exception('Invalid path, must begin with moveto.')
+    ends = [index for _, index in commands[1:]] + [len(numbers)]
+    for (command, i), end in zip(commands, ends):
+        count, implicit = COMMANDS[command]
+        if i + count == end:
+            yield command, numbers[i:end]
+            continue
+        while True:
+            if i + count > end:
+                if end == len(numbers):
+                    raise Exception('Unexpected end of path')
+                raise Exception('Invalid number of parameters')
+            yield command, numbers[i:i + count]
+            i += count
+            if i >= end:
+                break
+            command = implicit
+            count, implicit = COMMANDS[command]
+
+
+def iter_segments(commands, numbers):
+    """
+    Yield the absolute [command, params] segments of lexed path data with
+    the shorthand removed (M, L, C, Q, A and Z only), like simplepath.parsePath.
+    """
+    pen_x, pen_y = 0.0, 0.0
+    start_x, start_y = pen_x, pen_y
+    ctrl_x, ctrl_y = pen_x, pen_y
+    for command, params in iter_commands(commands, numbers):
+        upper = command.upper()
+        if command != upper:
+            if upper == 'H':
+                params[0] += pen_x
+            elif upper == 'V':
+                params[0] += pen_y
+            elif upper == 'A':
+                params[5] += pen_x
+                params[6] += pen_y
+            else:
+                for k in range(0, len(params), 2):
+                    params[k] += pen_x
+                    params[k + 1] += pen_y
+        if upper == 'A':
+            params[3] = int(params[3])
+            params[4] = int(params[4])
+        elif upper == 'H':
+            params = [params[0], pen_y]
+            upper = 'L'
+        elif upper == 'V':
+            params = [pen_x, params[0]]
+            upper = 'L'
+        elif upper == 'S' or upper == 'T':
+            params = [pen_x + (pen_x - ctrl_x), pen_y + (pen_y - ctrl_y)] + params
+            upper = 'C' if upper == 'S' else 'Q'
+
+        if upper == 'M':
+            start_x, start_y = params[0], params[1]
+        if upper == 'Z':
+            pen_x, pen_y = start_x, start_y
+        else:
+            pen_x, pen_y = params[-2], params[-1]
+        if upper == 'Q' or upper == 'C':
+            ctrl_x, ctrl_y = params[-4], params[-3]
+        else:
+            ctrl_x, ctrl_y = pen_x, pen_y
+        yield [upper, params]
+
+
+def parse_path(d):
+    """
+    Drop-in replacement of simplepath.parsePath.
+    """
+    return list(iter_segments(*lex_path(d)))
+
+
+def parse_nodes(d, mat=None):
+    """
+    Parse path data straight into one (n, 3, 2) array per subpath, each node
+    being [ctrl in, point, ctrl out], like flatten.csp_to_array applied to
+    cubicsuperpath.CubicSuperPath(simplepath.parsePath(d)).
+    The transform [mat] is applied to the whole path at once.
+    """
+    commands, numbers = lex_path(d)
+    # a node uses up at least one number (an arc 7 numbers for up to 5
+    # nodes), except those closing a subpath or ending the path
+    nodes = [0.0] * (6 * (len(numbers) + 2 * len(commands) + 2))
+    k = 0
+    sizes = []
+    first = 0
+    started = False
+    ctrl_x = ctrl_y = last_x = last_y = start_x = start_y = 0.0
+    for cmd, params in iter_segments(commands, numbers):
+        if cmd == 'M':
+            if started:
+                nodes[k:k + 6] = (ctrl_x, ctrl_y, last_x, last_y, last_x, last_y)
+                k += 6
+                sizes.append(k // 6 - first)
+                first = k // 6
+            start_x, start_y = params
+            last_x, last_y = params
+            ctrl_x, ctrl_y = params
+            started = True
+        elif cmd == 'L':
+            nodes[k:k + 6] = (ctrl_x, ctrl_y, last_x, last_y, last_x, last_y)
+            k += 6
+            last_x, last_y = params
+            ctrl_x, ctrl_y = params
+        elif cmd == 'C':
+            nodes[k:k + 6] = (ctrl_x, ctrl_y, last_x, last_y, params[0], params[1])
+            k += 6
+            last_x, last_y = params[4], params[5]
+            ctrl_x, ctrl_y = params[2], params[3]
+        elif cmd == 'Q':
+            q1x, q1y, q2x, q2y = params
+            nodes[k:k + 6] = (ctrl_x, ctrl_y, last_x, last_y,
+                              1./3*last_x+2./3*q1x, 1./3*last_y+2./3*q1y)
+            k += 6
+            ctrl_x, ctrl_y = 2./3*q1x+1./3*q2x, 2./3*q1y+1./3*q2y
+            last_x, last_y = q2x, q2y
+        elif cmd == 'A':
+            arc = cubicsuperpath.ArcToPath([last_x, last_y], params[:])
+            arc[0][0] = [ctrl_x, ctrl_y]
+            for (ax, ay), (bx, by), (cx, cy) in arc[:-1]:
+                nodes[k:k + 6] = (ax, ay, bx, by, cx, cy)
+                k += 6
+            (ctrl_x, ctrl_y), (last_x, last_y) = arc[-1][0], arc[-1][1]
+        elif cmd == 'Z':
+            nodes[k:k + 6] = (ctrl_x, ctrl_y, last_x, last_y, last_x, last_y)
+            k += 6
+            last_x, last_y = start_x, start_y
+            ctrl_x, ctrl_y = start_x, start_y
+    if not started:
+        return []
+    nodes[k:k + 6] = (ctrl_x, ctrl_y, last_x, last_y, last_x, last_y)
+    k += 6
+    sizes.append(k // 6 - first)
+
+    array = np.array(nodes[:k], dtype=float).reshape(-1, 3, 2)
+    if mat is not None:
+        transform.apply(mat, array, out=array)
+    return np.split(array, np.cumsum(sizes)[:-1])
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import random
+    from .svglib import simplepath
+    from . import flatten
+
+    # python -m gcode.lib.contour.pathdata [commands]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    random.seed(0)
+    parts = ['M 10.5,20.25']
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            parts.append('l %.3f,%.3f' % (random.uniform(-9, 9), random.uniform(-9, 9)))
+        elif kind == 1:
+            parts.append('C %.3f %.3f %.3f %.3f %.3f %.3f' % tuple(random.uniform(0, 500) for _ in range(6)))
+        elif kind == 2:
+            parts.append('s%.3f-%.3f,%.3fe-1 %.3f' % tuple(random.uniform(0, 50) for _ in range(4)))
+        elif kind == 3:
+            parts.append('H %.2f V %.2f' % (random.uniform(0, 500), random.uniform(0, 500)))
+        else:
+            parts.append('q %.3f %.3f %.3f %.3f z m 1 2' % tuple(random.uniform(-5, 5) for _ in range(4)))
+    d = ' '.join(parts)
+    print('{} commands, {:.1f} MB of path data'.format(count, len(d) / 1e6))
+
+    t = time.time()
+    old = simplepath.parsePath(d)
+    t_old = time.time() - t
+    t = time.time()
+    new = parse_path(d)
+    t_new = time.time() - t
+    print('parsePath:  simplepath {:.3f}s, pathdata {:.3f}s, same: {}'.format(t_old, t_new, old == new))
+
+    t = time.time()
+    old = flatten.csp_to_array(cubicsuperpath.CubicSuperPath(simplepath.parsePath(d)))
+    t_old = time.time() - t
+    t = time.time()
+    new = parse_nodes(d)
+    t_new = time.time() - t
+    same = len(old) == len(new) and all(np.array_equal(a, b) for a, b in zip(old, new))
+    print('node arrays: simplepath + CubicSuperPath {:.3f}s, pathdata {:.3f}s, same: {}'.format(t_old, t_new, same))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+from .svg import SvgPath, SvgPolylines
+
+# Number of points simplified together by iter_simplified.
+BATCH_SIZE = 50000
+
+
+def segment_distance(points, starts, ends):
+    """
+    Distance from every point to the segment [start, end] of the same row.
+    """
+    d = ends - starts
+    length2 = np.einsum('ij,ij->i', d, d)
+    v = points - starts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.einsum('ij,ij->i', v, d) / length2, 0.0, 1.0)
+    # degenerate chords (closed polylines) measure the distance to the point
+    t[length2 == 0] = 0.0
+    closest = starts + t[:, None] * d
+    return np.hypot(points[:, 0] - closest[:, 0], points[:, 1] - closest[:, 1])
+
+
+def rdp_mask(points, offsets, tolerance):
+    """
+    Ramer-Douglas-Peucker on many polylines at once. [points] holds all the
+    points, polyline i being points[offsets[i]:offsets[i + 1]]. Every level
+    splits all the ranges still too far from their chord in one pass.
+    Return the mask of the points to keep.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+    valid = ends >= starts
+    keep[starts[valid]] = True
+    keep[ends[valid]] = True
+
+    ranges = ends - starts >= 2
+    starts, ends = starts[ranges], ends[ranges]
+    while len(starts):
+        # interior points of every range, ranges laid out one after the other
+        counts = ends - starts - 1
+        owner = np.repeat(np.arange(len(starts)), counts)
+        first = np.cumsum(counts) - counts
+        index = starts[owner] + 1 + (np.arange(len(owner)) - first[owner])
+
+        d = segment_distance(points[index], points[starts[owner]], points[ends[owner]])
+        worst = np.maximum.reduceat(d, first)
+        # position of the (first) farthest point of each range
+        candidates = np.where(d == worst[owner], np.arange(len(d)), len(d))
+        split = index[np.minimum.reduceat(candidates, first)]
+
+        far = worst > tolerance
+        split = split[far]
+        keep[split] = True
+        left_s, left_e = starts[far], split
+        right_s, right_e = split, ends[far]
+        starts = np.concatenate((left_s, right_s))
+        ends = np.concatenate((left_e, right_e))
+        ranges = ends - starts >= 2
+        starts, ends = starts[ranges], ends[ranges]
+        order = np.argsort(starts, kind='stable')
+        starts, ends = starts[order], ends[order]
+    return keep
+
+
+def simplify_polylines(polylines, tolerance):
+    """
+    Drop the points of the polylines closer than [tolerance] to the simplified
+    line, first and last points always kept. Return (polylines, removed count).
+    """
+    if not polylines or tolerance <= 0:
+        return polylines, 0
+    sizes = [len(points) for points in polylines]
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    points = np.array([point[:2] for points in polylines for point in points], dtype=float).reshape(-1, 2)
+
+    keep = rdp_mask(points, offsets, tolerance)
+    total = np.zeros(len(keep) + 1, dtype=np.int64)
+    np.cumsum(keep, out=total[1:])
+    kept = total[offsets[1:]] - total[offsets[:-1]]
+    ends = np.cumsum(kept)
+    simplified = points[keep].tolist()
+    result = [simplified[end - count:end] for count, end in zip(kept.tolist(), ends.tolist())]
+    return result, int(len(points) - keep.sum())
+
+
+def iter_simplified(entities, tolerance, stats, size=BATCH_SIZE):
+    """
+    Pass SVG entities through with the segments of the paths simplified,
+    about [size] points at a time. The entities are not modified, paths are
+    replaced by SvgPolylines. The removed point count is added to stats['removed'].
+    """
+    pending = []
+    count = 0
+    for entity in entities:
+        pending.append(entity)
+        if isinstance(entity, SvgPath):
+            count += sum(len(points) for points in entity.segments)
+        if count >= size:
+            for done in simplify_entities(pending, tolerance, stats):
+                yield done
+            pending = []
+            count = 0
+    for done in simplify_entities(pending, tolerance, stats):
+        yield done
+
+
+def simplify_entities(entities, tolerance, stats):
+    paths = [entity for entity in entities if isinstance(entity, SvgPath)]
+    polylines, removed = simplify_polylines([points for path in paths for points in path.segments], tolerance)
+    stats['removed'] = stats.get('removed', 0) + removed
+    result = []
+    i = 0
+    for entity in entities:
+        if isinstance(entity, SvgPath):
+            count = len(entity.segments)
+            entity = SvgPolylines(polylines[i:i + count])
+            i += count
+        result.append(entity)
+    return result
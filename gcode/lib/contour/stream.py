@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+import copy
+from lxml import etree
+
+from . import transform
+from .svg import SvgLayerChange, SvgParser
+from .svglib import inkex
+
+import six
+if six.PY3:
+    basestring = str
+
+GROUP_TAGS = ('g', inkex.addNS('g', 'svg'))
+USE_TAGS = ('use', inkex.addNS('use', 'svg'))
+HREF = inkex.addNS('href', 'xlink')
+
+
+def release(node):
+    """
+    Free a closed element and the already processed siblings before it,
+    so that the tree only holds the open elements.
+    """
+    node.clear()
+    parent = node.getparent()
+    if parent is not None:
+        while node.getprevious() is not None:
+            del parent[0]
+
+
+class StreamSvgParser(SvgParser):
+    """
+    SvgParser reading the document with lxml iterparse instead of a tree.
+    Drawable elements become entities as they close and are freed right
+    after, memory is bounded by the depth of the document.
+    <use> clones are resolved from copies of the referenced elements only,
+    listed by a first pass over the document (see scan).
+    [source] is a file name or a seekable file object, [encoding] overrides
+    the encoding declared by the document.
+    """
+    def __init__(self, source, encoding=None, **kwargs):
+        SvgParser.__init__(self, None, **kwargs)
+        self.source = source
+        self.encoding = encoding
+        # ids referenced by <use> and count of drawable elements, see scan
+        self.refs = None
+        self.total = None
+        # copies of the referenced elements, by id (see SvgParser.find_id)
+        self.ids = {}
+
+    def iterparse(self, events):
+        if hasattr(self.source, 'seek'):
+            self.source.seek(0)
+        options = dict(events=events, huge_tree=True, remove_comments=True, remove_pis=True)
+        if self.encoding:
+            options['encoding'] = self.encoding
+        return etree.iterparse(self.source, **options)
+
+    def scan(self):
+        """
+        First pass: count the drawable elements and list the ids used by <use>.
+        """
+        tags = SvgParser.path_tags()
+        refs = set()
+        total = 0
+        for _, node in self.iterparse(('end',)):
+            if node.tag in tags:
+                total += 1
+            elif node.tag in USE_TAGS:
+                href = node.get(HREF)
+                if href:
+                    refs.add(href[1:])
+            release(node)
+        self.refs = refs
+        self.total = total
+
+    def count_entities(self):
+        if self.total is None:
+            self.scan()
+        return self.total
+
+    def iter_document(self):
+        """
+        Second pass: entities in drawing order, like SvgParser.iterTraverseSvg
+        on the whole tree. Clones of elements defined further down the
+        document are drawn at the end.
+        """
+        if self.refs is None:
+            self.scan()
+        # one (kind, transform, visibility) per open element, kind being
+        # 'group' for the elements whose children are traversed
+        stack = []
+        # open elements kept whole for <use>
+        keep = 0
+        deferred = []
+        for event, node in self.iterparse(('start', 'end')):
+            if event == 'start':
+                if node.get('id') in self.refs:
+                    keep += 1
+                if not stack:
+                    # root, its own transform is ignored like in SvgParser.parse
+                    self.svg = node
+                    stack.append(('group', self.page_transform(), 'visible'))
+                    continue
+                kind, current_transform, parent_visibility = stack[-1]
+                if kind != 'group':
+                    stack.append(('skip', None, None))
+                    continue
+
+                node_visibility = node.get('visibility', parent_visibility)
+                if node_visibility == 'inherit':
+                    node_visibility = parent_visibility
+                node_transform = current_transform
+                if node.get('transform'):
+                    node_transform = transform.compose(current_transform, self.parse_transform(node.get('transform')))
+
+                if node.tag in GROUP_TAGS:
+                    if node.get(inkex.addNS('groupmode', 'inkscape')) == 'layer':
+                        yield SvgLayerChange(node.get(inkex.addNS('label', 'inkscape')))
+                    stack.append(('group', node_transform, node_visibility))
+                elif node.tag in USE_TAGS:
+                    stack.append(('skip', None, None))
+                    refid = node.get(HREF)
+                    if refid:
+                        x = float(node.get('x', '0'))
+                        y = float(node.get('y', '0'))
+                        if (x != 0) or (y != 0):
+                            node_transform = transform.compose(node_transform, transform.translate(x, y))
+                        node_visibility = node.get('visibility', node_visibility)
+                        refnode = self.find_id(refid[1:])
+                        if refnode is None:
+                            deferred.append((refid[1:], node_transform, node_visibility))
+                        else:
+                            for entity in self.iterTraverseSvg([refnode], node_transform, parent_visibility=node_visibility):
+                                yield entity
+                elif isinstance(node.tag, basestring):
+                    stack.append(('entity', node_transform, node_visibility))
+                else:
+                    stack.append(('skip', None, None))
+            else:
+                kind, node_transform, _ = stack.pop()
+                if kind == 'entity':
+                    entity = self.make_entity(node, node_transform)
+                    if entity is not None:
+                        yield entity
+                node_id = node.get('id')
+                if node_id in self.refs:
+                    keep -= 1
+                    if node_id not in self.ids:
+                        self.ids[node_id] = copy.deepcopy(node)
+                if not keep:
+                    release(node)
+
+        for refid, node_transform, node_visibility in deferred:
+            refnode = self.find_id(refid)
+            if refnode is not None:
+                for entity in self.iterTraverseSvg([refnode], node_transform, parent_visibility=node_visibility):
+                    yield entity
@@ -2,6 +2,10 @@
 
 from lxml import etree
 
+from . import flatten
+from . import parallel
+from . import pathdata
+from . import transform
 from .svglib import bezmisc
 from .svglib import cubicsuperpath
 from .svglib import ffgeom
@@ -9,20 +13,23 @@ from .svglib import inkex
 from .svglib import simplepath
 from .svglib import simpletransform
 
-from collections import namedtuple
-Point_Tuple = namedtuple('Point_Tuple', ('b0', 'b1', 'b2', 'b3'))
-Point = namedtuple('Point', ('x', 'y'))
-
 import six
 if six.PY3:
     basestring = str
 
+# Default max distance (mm) between a flattened segment and its bezier
+# curve, see the "flat" option.
+FLATNESS = 0.2
+
+# Scale from SVG user units to mm on the drawing area.
+PAGE_SCALE = 0.62 # 0.522
+
 
 class SvgEntity(object):
     """
     Base class for SVG entities.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         pass
 
 
@@ -30,33 +37,62 @@ class SvgIgnored(SvgEntity):
     """
     An SVG entity which will not be rendered.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         self.tag = node.tag
 
 
 class SvgPath(SvgEntity):
     """
     An SVG entity which will render a segmented line.
+
+    The flattening engine is chosen with the "engine" option: 'numpy'
+    (default) parses the path with pathdata and subdivides all its curves
+    in batches, 'legacy' keeps the original simplepath parser and
+    point-by-point subdivision for comparison.
+    The "flat" option is the flattening tolerance in mm (FLATNESS by default).
+    With the numpy engine a shared flatten.FlattenBatch may be passed as
+    the "batch" option, the segments are then filled in by batch.flush().
+    A parallel.ParallelBatch passed as the "jobs" option defers parsing too.
     """
-    def __init__(self, node, node_transform):
+    engines = ('numpy', 'legacy')
+
+    def __init__(self, node, node_transform, **kwargs):
+        self.segments = []
+        engine = kwargs.get('engine') or 'numpy'
+        if engine not in SvgPath.engines:
+            raise ValueError('unknown flattening engine: {}'.format(engine))
+
+        flat = kwargs.get('flat') or FLATNESS
         d = node.get('d')
 
+        if engine == 'numpy':
+            jobs = kwargs.get('jobs')
+            if jobs is not None:
+                # parsed and flattened in another process, see parallel.ParallelBatch
+                jobs.add(self, d, node_transform)
+                return
+            subpaths = pathdata.parse_nodes(d, node_transform)
+            batch = kwargs.get('batch')
+            if batch is not None:
+                batch.add(self, subpaths)
+            else:
+                self.segments = [points.tolist() for points in flatten.flatten_subpaths(subpaths, flat)]
+            return
+
         path = simplepath.parsePath(d)
 
         if len(path) == 0:
             return
         
         path = cubicsuperpath.CubicSuperPath(path)
-        simpletransform.applyTransformToPath(node_transform, path)
+        simpletransform.applyTransformToPath(transform.to_list(node_transform), path)
 
         # path is now a list of lists of cubic beziers [ctrl p1, ctrl p2, endpoint]
         # where the start-point is the endpoint of the previous segment
-        self.segments = []
-        
         for cubic_bezier_path in path:
             points = []
             
-            self._subdivide_cubic_bezier_path(cubic_bezier_path, 0.2)    # TODO: smoothness preference
+            self._subdivide_cubic_bezier_path(cubic_bezier_path, flat)
 
             for p1, p2, endpoint in cubic_bezier_path:
                 points.append(p2)
@@ -69,14 +105,8 @@ class SvgPath(SvgEntity):
         """
         ((p0x, p0y), (p1x, p1y), (p2x, p2y), (p3x, p3y)) = points
 
-        p0 = ffgeom.Point(p0x, p0y)
-        p1 = ffgeom.Point(p1x, p1y)
-        p2 = ffgeom.Point(p2x, p2y)
-        p3 = ffgeom.Point(p3x, p3y)
-
-        s1 = ffgeom.Segment(p0, p3)
-
-        return max(s1.distanceToPoint(p1), s1.distanceToPoint(p2))
+        return max(ffgeom.distanceToSegment(p0x, p0y, p3x, p3y, p1x, p1y),
+                   ffgeom.distanceToSegment(p0x, p0y, p3x, p3y, p2x, p2y))
 
     def _subdivide_cubic_bezier_path(self, cubic_bezier_path, flat):
         """
@@ -107,8 +137,8 @@ class SvgPath(SvgEntity):
                 # Second bezier, first control point
                 p3 = cubic_bezier_path[i][1]
 
-                # b = (p0, p1, p2, p3)
-                b = Point_Tuple(Point(p0[0], p0[1]), Point(p1[0], p1[1]), Point(p2[0], p2[1]), Point(p3[0], p3[1]))
+                # plain (x, y) tuples, see bezmisc.beziersplitatt
+                b = ((p0[0], p0[1]), (p1[0], p1[1]), (p2[0], p2[1]), (p3[0], p3[1]))
 
                 if self._compute_max_distance(b) > flat:
                     break
@@ -137,11 +167,19 @@ class SvgPath(SvgEntity):
         return newpath
 
 
+class SvgPolylines(SvgPath):
+    """
+    An SvgPath made of already flattened segments (cache, simplification).
+    """
+    def __init__(self, segments):
+        self.segments = segments
+
+
 class SvgRect(SvgPath):
     """
     An SVG entity will render a rectangle.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         newpath = self.new_path_from_node(node)
 
         x = float(node.get('x'))
@@ -168,14 +206,14 @@ class SvgRect(SvgPath):
 
         newpath.set('d', simplepath.formatPath(a))
         
-        SvgPath.__init__(self, newpath, node_transform)
+        SvgPath.__init__(self, newpath, node_transform, **kwargs)
 
 
 class SvgLine(SvgPath):
     """
     An SVG entity that renders a line.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         newpath = self.new_path_from_node(node)
 
         x1 = float(node.get('x1'))
@@ -189,14 +227,14 @@ class SvgLine(SvgPath):
 
         newpath.set('d', simplepath.formatPath(a))
         
-        SvgPath.__init__(self, newpath, node_transform)
+        SvgPath.__init__(self, newpath, node_transform, **kwargs)
 
 
 class SvgPolyLine(SvgPath):
     """
     An SVG entity that renders as a segmented line.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         newpath = self.new_path_from_node(node)
         pl = node.get('points', '').strip()
 
@@ -215,20 +253,20 @@ class SvgPolyLine(SvgPath):
         
         newpath.set('d', d)
         
-        SvgPath.__init__(self, newpath, node_transform)
+        SvgPath.__init__(self, newpath, node_transform, **kwargs)
 
 
 class SvgEllipse(SvgPath):
     """
     An SVG entity that renders an ellipse.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         rx = float(node.get('rx', '0'))
         ry = float(node.get('ry', '0'))
 
         newpath = self.make_ellipse_path(rx, ry, node)
         
-        SvgPath.__init__(self, newpath, node_transform)
+        SvgPath.__init__(self, newpath, node_transform, **kwargs)
 
     def make_ellipse_path(self, rx, ry, node):
         if rx == 0 or ry == 0:
@@ -256,22 +294,22 @@ class SvgCircle(SvgEllipse):
     """
     An SVG entity that renders as an ellipse.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         rx = float(node.get('r', '0'))
 
         newpath = self.make_ellipse_path(rx, rx, node)
 
-        SvgPath.__init__(self, newpath, node_transform)
+        SvgPath.__init__(self, newpath, node_transform, **kwargs)
 
 
 class SvgText(SvgIgnored):
     """
     An SVG entity that renders as text.
     """
-    def __init__(self, node, node_transform):
+    def __init__(self, node, node_transform, **kwargs):
         print('unable to draw text. please convert it to a path first.')
 
-        SvgIgnored.__init__(self, node, node_transform)
+        SvgIgnored.__init__(self, node, node_transform, **kwargs)
 
 
 class SvgLayerChange(SvgEntity):
@@ -302,9 +340,25 @@ class SvgParser(object):
         'text': SvgText
     }
 
-    def __init__(self, svg):
+    def __init__(self, svg, **kwargs):
         self.svg = svg
         self.entities = []
+        # options forwarded to every entity, e.g. engine='legacy'
+        self.entity_options = dict(kwargs)
+        self.flat = kwargs.get('flat') or FLATNESS
+        # parsed "transform" attributes of the document, by text
+        self.transforms = {}
+        # id -> node index of the document, built at the first <use>
+        self.ids = None
+        self.batch = None
+        if (kwargs.get('engine') or 'numpy') == 'numpy':
+            if kwargs.get('parallel'):
+                # flatten across processes, workers=None uses all cores
+                self.batch = parallel.ParallelBatch(self.flat, workers=kwargs.get('workers'))
+                self.entity_options['jobs'] = self.batch
+            else:
+                self.batch = flatten.FlattenBatch(self.flat)
+                self.entity_options['batch'] = self.batch
 
     def parseLengthWithUnits(self, attr):
         """ 
@@ -374,26 +428,107 @@ class SvgParser(object):
         #         [0.0, -0.28222, (height / 2.0)]
         #     ])
 
-        width = self.getLength('width', 800) * 0.62 # 0.522
-        height = self.getLength('height', 400) * 0.62 # 0.522
-        self.recursivelyTraverseSvg(
-            self.svg,
-            [
-                [0.62, 0.0, -(width / 2.0)],
-                [0.0, -0.62, (height / 2.0)]
-            ])
+        try:
+            self.recursivelyTraverseSvg(self.svg, self.page_transform())
+            self.flush()
+        finally:
+            self.close()
+
+    def page_transform(self):
+        """
+        Transform from SVG user units to the centered drawing area.
+        """
+        width = self.getLength('width', 800) * PAGE_SCALE
+        height = self.getLength('height', 400) * PAGE_SCALE
+        return transform.from_list([
+            [PAGE_SCALE, 0.0, -(width / 2.0)],
+            [0.0, -PAGE_SCALE, (height / 2.0)]
+        ])
+
+    def count_entities(self):
+        """
+        Number of nodes of the document making a drawable entity, an estimate
+        of the work to do (clones made by <use> are not counted).
+        """
+        tags = SvgParser.path_tags()
+        return sum(1 for node in self.svg.iter() if node.tag in tags)
+
+    @staticmethod
+    def path_tags():
+        """
+        Tags of the nodes making an SvgPath, with and without the svg namespace.
+        """
+        tags = set()
+        for nodetype, cls in SvgParser.entity_map.items():
+            if issubclass(cls, SvgPath):
+                tags.add(nodetype)
+                tags.add(inkex.addNS(nodetype, 'svg'))
+        return tags
+
+    def flush(self):
+        """
+        Complete the segments of the entities still queued in the flattening batch.
+        """
+        if self.batch is not None:
+            self.batch.flush()
+
+    def close(self):
+        """
+        Stop the worker processes of a parallel batch, once the document is
+        parsed or its parsing abandoned.
+        """
+        if isinstance(self.batch, parallel.ParallelBatch):
+            self.batch.close()
+
+    def iter_entities(self):
+        """
+        Parse the SVG data lazily, yielding each entity once its segments
+        are complete. Entities are not kept in self.entities.
+        """
+        pending = []
+        try:
+            for entity in self.iter_document():
+                pending.append(entity)
+                if self.batch is None or not self.batch.pending:
+                    for done in pending:
+                        yield done
+                    pending = []
+            self.flush()
+        finally:
+            # also when the caller stops early, e.g. a cancelled conversion
+            self.close()
+        for done in pending:
+            yield done
+
+    def iter_document(self):
+        """
+        Entities of the whole document in drawing order, segments possibly pending.
+        """
+        return self.iterTraverseSvg(self.svg, self.page_transform())
 
     def recursivelyTraverseSvg(self, nodeList, current_transform=[[1.0, 0.0, 0.0], [0.0, -1.0, 0.0]], parent_visibility='visible'):
+        """
+        Recursively traverse the svg file to plot out all of the
+        paths, collecting the entities in self.entities.
+        See iterTraverseSvg.
+        """
+        self.entities.extend(self.iterTraverseSvg(nodeList, current_transform, parent_visibility))
+
+    def iterTraverseSvg(self, nodeList, current_transform=[[1.0, 0.0, 0.0], [0.0, -1.0, 0.0]], parent_visibility='visible'):
         """
         Recursively traverse the svg file to plot out all of the
         paths. The function keeps track of the composite transformation
-        that should be applied to each path.
+        that should be applied to each path and yields the entities in
+        document order.
 
         This function handles path, group, line, rect, polyline, polygon,
         circle, ellipse and use (clone) elements. Notable elements not
         handled include text. Unhandled elements should be converted to
         paths in Inkscape.
+        Transforms are 3x3 affine arrays (see transform), simpletransform
+        matrices are accepted as [current_transform].
         """
+        current_transform = transform.from_list(current_transform)
         for node in nodeList:
             # Ignore invisible nodes
             node_visibility = node.get('visibility', parent_visibility)
@@ -405,36 +540,39 @@ class SvgParser(object):
                 pass
 
             # Apply the current matrix transform to this node's transform
-            node_transform = simpletransform.composeTransform(current_transform, simpletransform.parseTransform(node.get('transform')))
+            node_transform = current_transform
+            if node.get('transform'):
+                node_transform = transform.compose(current_transform, self.parse_transform(node.get('transform')))
 
             # Root and group tags
             if node.tag == inkex.addNS('g', 'svg') or node.tag == 'g':
                 if (node.get(inkex.addNS('groupmode', 'inkscape')) == 'layer'):
                     layer_name = node.get(inkex.addNS('label', 'inkscape'))
                     
-                    self.entities.append(SvgLayerChange(layer_name))
+                    yield SvgLayerChange(layer_name)
                 
-                self.recursivelyTraverseSvg(node, node_transform, parent_visibility=node_visibility)
+                for entity in self.iterTraverseSvg(node, node_transform, parent_visibility=node_visibility):
+                    yield entity
             # Use tags
             elif node.tag == inkex.addNS('use', 'svg') or node.tag == 'use':
                 refid = node.get(inkex.addNS('href', 'xlink'))
                 
                 if refid:
                     # [1:] to ignore leading '#' in reference
-                    path = '//*[@id="%s"]' % refid[1:]
-                    refnode = node.xpath(path)
+                    refnode = self.find_id(refid[1:])
                     
-                    if refnode:
+                    if refnode is not None:
                         x = float(node.get('x', '0'))
                         y = float(node.get('y', '0'))
                         
                         if (x != 0) or (y != 0):
-                            node_transform = simpletransform.composeTransform(node_transform, simpletransform.parseTransform('translate(%f,%f)' % (x, y)))
+                            node_transform = transform.compose(node_transform, transform.translate(x, y))
                         
                         # TODO: this looks unnecessary
                         node_visibility = node.get('visibility', node_visibility)
 
-                        self.recursivelyTraverseSvg(refnode, node_transform, parent_visibility=node_visibility)
+                        for entity in self.iterTraverseSvg([refnode], node_transform, parent_visibility=node_visibility):
+                            yield entity
             elif not isinstance(node.tag, basestring):
                 pass
             # Entity tags
@@ -444,6 +582,30 @@ class SvgParser(object):
                 if entity == None:
                     pass
                     # print('unable to draw object, please convert it to a path first.')
+                else:
+                    yield entity
+
+    def parse_transform(self, text):
+        """
+        Parse a "transform" attribute, each distinct text once per document.
+        """
+        mat = self.transforms.get(text)
+        if mat is None:
+            mat = self.transforms[text] = transform.parse_transform(text)
+        return mat
+
+    def find_id(self, node_id):
+        """
+        Node of the document with the given id, None if there is none.
+        The index is built once, so that clones do not search the whole tree.
+        """
+        if self.ids is None:
+            self.ids = {}
+            for node in self.svg.iter():
+                key = node.get('id')
+                if key is not None and key not in self.ids:
+                    self.ids[key] = node
+        return self.ids.get(node_id)
 
     def make_entity(self, node, node_transform):
         """
@@ -460,11 +622,50 @@ class SvgParser(object):
             if node.tag == inkex.addNS(tag, ns) or node.tag == tag:
                 cls = SvgParser.entity_map[nodetype]
 
-                entity = cls(node, node_transform)
-                self.entities.append(entity)
-                
-                return entity
+                return cls(node, node_transform, **self.entity_options)
         
         return None
 
 
+if __name__ == '__main__':
+    import sys
+    import time
+    import random
+    import tracemalloc
+    from collections import namedtuple
+
+    # python -m gcode.lib.contour.svg [curves]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    random.seed(0)
+    curves = [tuple((random.uniform(0, 500), random.uniform(0, 500)) for _ in range(4)) for _ in range(count)]
+    Point_Tuple = namedtuple('Point_Tuple', ('b0', 'b1', 'b2', 'b3'))
+    Point = namedtuple('Point', ('x', 'y'))
+
+    def objects(b):
+        # what a subdivision step used to allocate: namedtuples and ffgeom objects
+        b = Point_Tuple(*[Point(x, y) for x, y in b])
+        s1 = ffgeom.Segment(ffgeom.Point(*b.b0), ffgeom.Point(*b.b3))
+        p1, p2 = ffgeom.Point(*b.b1), ffgeom.Point(*b.b2)
+        d = max(s1.distanceToPoint(p1), s1.distanceToPoint(p2))
+        return d, bezmisc.beziersplitatt(b, 0.5), (b, s1, p1, p2)
+
+    def tuples(b):
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = b
+        d = max(ffgeom.distanceToSegment(x0, y0, x3, y3, x1, y1), ffgeom.distanceToSegment(x0, y0, x3, y3, x2, y2))
+        return d, bezmisc.beziersplitatt(b, 0.5), ()
+
+    for step in (objects, tuples):
+        t = time.time()
+        for b in curves:
+            step(b)
+        elapsed = time.time() - t
+        # keep everything a step allocates to measure it
+        tracemalloc.start()
+        kept = [step(b) for b in curves[:10000]]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        print('{:8s} {:.3f}s for {} steps, {:.0f} bytes allocated per step'.format(
+            step.__name__, elapsed, count, size / 10000.0))
+    same = all(objects(b)[:2] == tuples(b)[:2] for b in curves[:10000])
+    print('same: {}'.format(same))
@@ -59,15 +59,14 @@ def rootWrapper(a, b, c, d):
 
 # def bezierparameterize(((bx0, by0), (bx1, by1), (bx2, by2), (bx3, by3))):
 def bezierparameterize(bt):
-    # parametric bezier
-    x0 = bt.b0.x
-    y0 = bt.b0.y
-    cx = 3 * (bt.b1.x - x0)
-    bx = 3 * (bt.b2.x - bt.b1.x) - cx
-    ax = bt.b3.x - x0 - cx - bx
-    cy = 3 * (bt.b1.y - y0)
-    by = 3 * (bt.b2.y - bt.b1.y) - cy
-    ay = bt.b3.y - y0 - cy - by
+    # parametric bezier, bt is any sequence of four (x, y) pairs
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = bt
+    cx = 3 * (x1 - x0)
+    bx = 3 * (x2 - x1) - cx
+    ax = x3 - x0 - cx - bx
+    cy = 3 * (y1 - y0)
+    by = 3 * (y2 - y1) - cy
+    ay = y3 - y0 - cy - by
 
     return ax, ay, bx, by, cx, cy, x0, y0
     # ax,ay,bx,by,cx,cy,x0,y0=bezierparameterize(((bx0,by0),(bx1,by1),(bx2,by2),(bx3,by3)))
@@ -75,10 +74,11 @@ def bezierparameterize(bt):
 # def linebezierintersect(((lx1, ly1), (lx2, ly2)), ((bx0, by0), (bx1, by1), (bx2, by2), (bx3, by3))):
 def linebezierintersect(lt, bt):
     # parametric line
-    dd = lt.l1.x
-    cc = lt.l2.x - lt.l1.x
-    bb = lt.l1.y
-    aa = lt.l2.y - lt.l1.y
+    (lx1, ly1), (lx2, ly2) = lt
+    dd = lx1
+    cc = lx2 - lx1
+    bb = ly1
+    aa = ly2 - ly1
 
     if aa:
         coef1 = cc / aa
@@ -121,13 +121,14 @@ def bezierslopeatt(bt, t):
 def beziertatslope(bt, d):
     ax, ay, bx, by, cx, cy, x0, y0 = bezierparameterize(bt)
     # quadratic coefficents of slope formula
-    if d.x:
-        slope = 1.0 * (d.y / d.x)
+    dx, dy = d
+    if dx:
+        slope = 1.0 * (dy / dx)
         a = 3 * ay - 3 * ax * slope
         b = 2 * by - 2 * bx * slope
         c = cy - cx * slope
-    elif d.y:
-        slope = 1.0 * (d.x / d.y)
+    elif dy:
+        slope = 1.0 * (dx / dy)
         a = 3 * ax - 3 * ay * slope
         b = 2 * bx - 2 * by * slope
         c = cx - cy * slope
@@ -150,14 +151,16 @@ def tpoint(b1, b2, t):
 
 
 def beziersplitatt(bt, t):
-    m1 = tpoint((bt.b0.x, bt.b0.y), (bt.b1.x, bt.b1.y), t)
-    m2 = tpoint((bt.b1.x, bt.b1.y), (bt.b2.x, bt.b2.y), t)
-    m3 = tpoint((bt.b2.x, bt.b2.y), (bt.b3.x, bt.b3.y), t)
-    m4 = tpoint(m1, m2, t)
-    m5 = tpoint(m2, m3, t)
-    m = tpoint(m4, m5, t)
+    # de Casteljau on raw floats, no intermediate point objects
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = bt
+    m1x, m1y = x0 + t * (x1 - x0), y0 + t * (y1 - y0)
+    m2x, m2y = x1 + t * (x2 - x1), y1 + t * (y2 - y1)
+    m3x, m3y = x2 + t * (x3 - x2), y2 + t * (y3 - y2)
+    m4x, m4y = m1x + t * (m2x - m1x), m1y + t * (m2y - m1y)
+    m5x, m5y = m2x + t * (m3x - m2x), m2y + t * (m3y - m2y)
+    m = (m4x + t * (m5x - m4x), m4y + t * (m5y - m4y))
 
-    return ((bt.b0.x, bt.b0.y), m1, m4, m), (m, m5, m3, (bt.b3.x, bt.b3.y))
+    return ((x0, y0), (m1x, m1y), (m4x, m4y), m), (m, (m5x, m5y), (m3x, m3y), (x3, y3))
 
 
 '''
@@ -183,7 +186,8 @@ University of Denmark.
 
 # def pointdistance((x1, y1), (x2, y2)):
 def pointdistance(b1, b2):
-    return math.sqrt(((b2.x - b1.x) ** 2) + ((b2.y - b1.y) ** 2))
+    (x1, y1), (x2, y2) = b1, b2
+    return math.sqrt(((x2 - x1) ** 2) + ((y2 - y1) ** 2))
 
 
 def Gravesen_addifclose(b, len, error=0.001):
@@ -26,14 +26,25 @@ except ValueError:
     PosInf = 1e300000
     NaN = PosInf/PosInf
 
-class Point:
+class Point(object):
+    __slots__ = ('x', 'y')
     precision = 5
     def __init__(self, x, y):
-        self.__coordinates = {'x' : float(x), 'y' : float(y)}
+        self.x = float(x)
+        self.y = float(y)
     def __getitem__(self, key):
-        return self.__coordinates[key]
+        if key == 'x':
+            return self.x
+        if key == 'y':
+            return self.y
+        raise KeyError(key)
     def __setitem__(self, key, value):
-        self.__coordinates[key] = float(value)
+        if key == 'x':
+            self.x = float(value)
+        elif key == 'y':
+            self.y = float(value)
+        else:
+            raise KeyError(key)
     def __repr__(self):
         return '(%s, %s)' % (round(self['x'],self.precision),round(self['y'],self.precision))
     def copy(self):
@@ -45,7 +56,8 @@ class Point:
         self['x'] = float(x)
         self['y'] = float(y)
 
-class Segment:
+class Segment(object):
+    __slots__ = ('_Segment__endpoints',)
     def __init__(self, e0, e1):
         self.__endpoints = [e0, e1]
     def __getitem__(self, key):
@@ -137,5 +149,19 @@ def intersectSegments(s1, s2):
 def dot(s1, s2):
     return s1.delta_x() * s2.delta_x() + s1.delta_y() * s2.delta_y()
 
+def distanceToSegment(x0, y0, x1, y1, px, py):
+    """Segment(Point(x0, y0), Point(x1, y1)).distanceToPoint(Point(px, py)) on raw floats."""
+    dx = x1 - x0
+    dy = y1 - y0
+    c1 = (px - x0) * dx + (py - y0) * dy
+    if c1 <= 0:
+        return math.sqrt(((x0 - px) ** 2) + ((y0 - py) ** 2))
+    c2 = dx * dx + dy * dy
+    if c2 <= c1:
+        return math.sqrt(((x1 - px) ** 2) + ((y1 - py) ** 2))
+    len = math.sqrt((dx ** 2) + (dy ** 2))
+    if len == 0: return NaN
+    return math.fabs((dx * (y0 - py)) - ((x0 - px) * dy)) / len
+
 
 # vim: expandtab shiftwidth=4 tabstop=8 softtabstop=4 encoding=utf-8 textwidth=99
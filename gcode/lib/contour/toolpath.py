@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+import math
+import numpy as np
+
+# One opcode per GCode line.
+HOME = 0        # G0 to the home position
+TRAVEL = 1      # G0 to a point, pen up
+PEN_DOWN = 2    # G0 Z down
+DRAW = 3        # G1 to a point
+PEN_UP = 4      # G0 Z up
+ARC_CW = 5      # G2 to a point, I/J center offset
+ARC_CCW = 6     # G3 to a point, I/J center offset
+
+# Line templates, every one takes (x, y, i, j) so that all lines render with
+# the same % expression; unused values are swallowed with %.0s.
+TEMPLATES = {
+    HOME: 'G0 X%.2f Y%.2f Z{z_home} F{moving_feedrate}%.0s%.0s',
+    TRAVEL: 'G0 X%.2f Y%.2f Z{z_offset_pen_up} F{moving_feedrate}%.0s%.0s',
+    PEN_DOWN: 'G0 Z{z_offset} F{moving_feedrate}%.0s%.0s%.0s%.0s',
+    DRAW: 'G1 X%.2f Y%.2f F{drawing_feedrate}%.0s%.0s',
+    PEN_UP: 'G0 Z{z_offset_pen_up} F{moving_feedrate}%.0s%.0s%.0s%.0s',
+    ARC_CW: 'G2 X%.2f Y%.2f I%.2f J%.2f F{drawing_feedrate}',
+    ARC_CCW: 'G3 X%.2f Y%.2f I%.2f J%.2f F{drawing_feedrate}',
+}
+HAS_XY = (True, True, False, True, False, True, True)
+
+
+def arc_sweeps(start, end, ij, clockwise):
+    """
+    (center, radius, a0, sweep) of arrays of arcs, swept counterclockwise
+    from the angle a0: a clockwise arc is swept from its end.
+    """
+    center = start + ij
+    radius = np.hypot(*(start - center).T)
+    a0 = np.arctan2(*(start - center).T[::-1])
+    a1 = np.arctan2(*(end - center).T[::-1])
+    a0, a1 = np.where(clockwise, a1, a0), np.where(clockwise, a0, a1)
+    return center, radius, a0, (a1 - a0) % (2 * np.pi)
+
+
+def arc_crossings(center, radius, a0, sweep):
+    """
+    Points where arcs cross the axes through their center, they bound an
+    arc along with its ends.
+    """
+    points = []
+    for k in range(4):
+        angle = k * np.pi / 2
+        inside = (angle - a0) % (2 * np.pi) < sweep
+        points.append(center[inside] + radius[inside, None] * [np.cos(angle), np.sin(angle)])
+    return np.concatenate(points)
+
+
+class Toolpath(object):
+    """
+    Numeric form of a GCode program: an opcode per line and the X/Y of the
+    line in machine coordinates, plus the I/J center offset of arcs.
+    Scale, offset, feedrate and Z changes are applied to the arrays and the
+    text is rendered in one pass.
+    The extents and the move lengths are summed up as the lines are frozen,
+    in program units; scale and offset only map them (see extents, stats).
+    """
+    def __init__(self):
+        self._ops = []
+        self._xy = []
+        self._ij = {}
+        self.ops = None
+        self.xy = None
+        self.ij = None
+        # running (x_min, x_max, y_min, y_max) of the points but home
+        self._extents = None
+        self._draw_length = 0.0
+        self._travel_length = 0.0
+        self._segments = 0
+        self._pen_moves = 0
+        self._homes = 0
+        # moves from or to the home position, measured once it is known
+        self._home_moves = []
+        # last row having coordinates, where the next move starts
+        self._last = None
+
+    def append(self, op, x=0.0, y=0.0, i=None, j=None):
+        if i is not None:
+            self._ij[len(self._ops)] = (i, j)
+        self._ops.append(op)
+        self._xy.append((x, y))
+
+    def freeze(self):
+        """
+        Move the recorded lines into the ops/xy arrays.
+        """
+        ops = np.array(self._ops, dtype=np.int8)
+        # keep the 2 decimals written in the text template (np.round does not
+        # always round like '%.2f'), so both renderings give the same program
+        xy = np.array(['%.2f' % v for v in np.ravel(self._xy)], dtype=float).reshape(-1, 2)
+        ij = np.zeros_like(xy)
+        if self._ij:
+            rows = list(self._ij.keys())
+            ij[rows] = np.array(['%.2f' % v for v in np.ravel(list(self._ij.values()))], dtype=float).reshape(-1, 2)
+        start = 0
+        if self.ops is not None:
+            start = len(self.ops)
+            ops = np.concatenate((self.ops, ops))
+            xy = np.concatenate((self.xy, xy))
+            ij = np.concatenate((self.ij, ij))
+        self.ops, self.xy, self.ij = ops, xy, ij
+        self._ops = []
+        self._xy = []
+        self._ij = {}
+        self._measure(start)
+        return self
+
+    def _measure(self, start):
+        """
+        Add the lines from [start] to the running extents, lengths and counts.
+        """
+        ops = self.ops[start:]
+        self._segments += int(np.isin(ops, (DRAW, ARC_CW, ARC_CCW)).sum())
+        self._pen_moves += int(np.isin(ops, (PEN_DOWN, PEN_UP)).sum())
+        self._homes += int((ops == HOME).sum())
+        rows = np.flatnonzero(np.array(HAS_XY)[ops]) + start
+        if not len(rows):
+            return
+        # every move starts at the previous row having coordinates
+        if self._last is not None:
+            rows = np.concatenate(([self._last], rows))
+        self._last = int(rows[-1])
+
+        points = self.xy[rows[self.ops[rows] != HOME]]
+        begin, end = rows[:-1], rows[1:]
+        home = (self.ops[begin] == HOME) | (self.ops[end] == HOME)
+        self._home_moves.extend(zip(begin[home].tolist(), end[home].tolist()))
+        begin, end = begin[~home], end[~home]
+        end_ops = self.ops[end]
+        lengths = np.hypot(*(self.xy[end] - self.xy[begin]).T)
+        arcs = np.flatnonzero((end_ops == ARC_CW) | (end_ops == ARC_CCW))
+        if len(arcs):
+            center, radius, a0, sweep = arc_sweeps(self.xy[begin[arcs]], self.xy[end[arcs]],
+                                                   self.ij[end[arcs]], end_ops[arcs] == ARC_CW)
+            lengths[arcs] = radius * sweep
+            points = np.concatenate((points, arc_crossings(center, radius, a0, sweep)))
+        self._travel_length += float(lengths[end_ops == TRAVEL].sum())
+        self._draw_length += float(lengths[end_ops != TRAVEL].sum())
+
+        if len(points):
+            extents = (points[:, 0].min(), points[:, 0].max(), points[:, 1].min(), points[:, 1].max())
+            if self._extents is not None:
+                extents = (min(extents[0], self._extents[0]), max(extents[1], self._extents[1]),
+                           min(extents[2], self._extents[2]), max(extents[3], self._extents[3]))
+            self._extents = tuple(float(v) for v in extents)
+
+    def __len__(self):
+        return len(self._ops) + (0 if self.ops is None else len(self.ops))
+
+    def transform(self, config, scale=1.0, x_offset=0.0, y_offset=0.0):
+        """
+        X/Y of every line once the home position is filled in and the scale
+        and offset applied. Lines without coordinates hold garbage.
+        """
+        xy = self.xy.copy()
+        home = self.ops == HOME
+        xy[home, 0] = config['x_home']
+        xy[home, 1] = config['y_home']
+        xy *= scale
+        xy[:, 0] += x_offset
+        xy[:, 1] += y_offset
+        return xy
+
+    def extents(self, config, scale=1.0, x_offset=0.0, y_offset=0.0):
+        """
+        (x_min, x_max, y_min, y_max) of the lines having coordinates, arcs
+        included, once transformed like transform(); None if empty.
+        Mapped from the running extents, the lines are not read again.
+        """
+        points = []
+        if self._extents is not None:
+            x_min, x_max, y_min, y_max = self._extents
+            points += [(x_min, y_min), (x_max, y_max)]
+        if self._homes:
+            points.append((config['x_home'], config['y_home']))
+        if not points:
+            return None
+        xs = [x * scale + x_offset for x, _ in points]
+        ys = [y * scale + y_offset for _, y in points]
+        return min(xs), max(xs), min(ys), max(ys)
+
+    def stats(self, config, scale=1.0):
+        """
+        Job statistics once scaled: drawing and travel length (mm), count of
+        drawing segments and pen moves, and the run time (s) estimated from
+        the feedrates (mm/min) and the Z moves of the pen, acceleration left
+        out. Moves from or to home are straight.
+        """
+        home = (config['x_home'], config['y_home'])
+        draw_length = self._draw_length
+        travel_length = self._travel_length
+        for begin, end in self._home_moves:
+            x0, y0 = home if self.ops[begin] == HOME else self.xy[begin].tolist()
+            x1, y1 = home if self.ops[end] == HOME else self.xy[end].tolist()
+            if self.ops[end] in (HOME, TRAVEL):
+                travel_length += math.hypot(x1 - x0, y1 - y0)
+            else:
+                draw_length += math.hypot(x1 - x0, y1 - y0)
+        draw_length *= scale
+        travel_length *= scale
+        z_length = abs(config['z_offset_pen_up'] - config['z_offset']) * self._pen_moves
+        duration = 0.0
+        for length, feedrate in ((draw_length, config['drawing_feedrate']),
+                                 (travel_length + z_length, config['moving_feedrate'])):
+            if length:
+                duration += 60.0 * length / feedrate if feedrate > 0 else float('inf')
+        return {
+            'draw_length': draw_length,
+            'travel_length': travel_length,
+            'segments': self._segments,
+            'pen_moves': self._pen_moves,
+            'time': duration,
+        }
+
+    def render(self, config, xy=None, scale=1.0):
+        """
+        Render the GCode text with the template values of [config].
+        [scale] is the one applied to [xy], I/J are scaled the same way.
+        """
+        return Lines(self, config, xy, scale).text()
+
+
+class Lines(object):
+    """
+    GCode lines of a Toolpath rendered on demand, the text of Toolpath.render
+    one line or one slice at a time for views showing part of the program.
+    """
+    def __init__(self, toolpath, config, xy=None, scale=1.0):
+        if xy is None:
+            xy = toolpath.transform(config)
+        self.templates = [TEMPLATES[op].format(**config) for op in sorted(TEMPLATES)]
+        self.ops = toolpath.ops
+        self.xy = xy
+        self.ij = toolpath.ij * scale
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self.lines(start, stop)
+            return [self[i] for i in range(start, stop, step)]
+        return self.templates[self.ops[index]] % tuple(self.xy[index].tolist() + self.ij[index].tolist())
+
+    def lines(self, start=0, stop=None):
+        xy = self.xy[start:stop]
+        ij = self.ij[start:stop]
+        templates = [self.templates[op] for op in self.ops[start:stop].tolist()]
+        return [line % values for line, values in
+                zip(templates, zip(xy[:, 0].tolist(), xy[:, 1].tolist(), ij[:, 0].tolist(), ij[:, 1].tolist()))]
+
+    def text(self, start=0, stop=None):
+        return '\n'.join(self.lines(start, stop))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+import re
+import math
+import numpy as np
+
+# One transform of a "transform" attribute: name and arguments. Transforms
+# are separated by whitespace and/or a comma, with whitespace on either side.
+TRANSFORM = re.compile(r'\s*(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?')
+
+
+def identity():
+    return np.eye(3)
+
+
+def from_list(mat):
+    """
+    3x3 affine array of a simpletransform [[a, c, e], [b, d, f]] matrix,
+    3x3 arrays are returned as they are.
+    """
+    mat = np.asarray(mat, dtype=float)
+    if mat.shape == (3, 3):
+        return mat
+    return np.vstack((mat, (0.0, 0.0, 1.0)))
+
+
+def to_list(mat):
+    """
+    simpletransform [[a, c, e], [b, d, f]] matrix of a 3x3 affine array.
+    """
+    return np.asarray(mat)[:2].tolist()
+
+
+def compose(m1, m2):
+    """
+    m1 applied after m2, see simpletransform.composeTransform.
+    """
+    # written out rather than m1.dot(m2): same operations in the same order
+    # as composeTransform, so that the output does not move by a rounding
+    a = m1[0, 0] * m2[0, 0] + m1[0, 1] * m2[1, 0]
+    c = m1[0, 0] * m2[0, 1] + m1[0, 1] * m2[1, 1]
+    b = m1[1, 0] * m2[0, 0] + m1[1, 1] * m2[1, 0]
+    d = m1[1, 0] * m2[0, 1] + m1[1, 1] * m2[1, 1]
+    e = m1[0, 0] * m2[0, 2] + m1[0, 1] * m2[1, 2] + m1[0, 2]
+    f = m1[1, 0] * m2[0, 2] + m1[1, 1] * m2[1, 2] + m1[1, 2]
+    return np.array(((a, c, e), (b, d, f), (0.0, 0.0, 1.0)))
+
+
+def translate(dx, dy=0.0):
+    return np.array(((1.0, 0.0, dx), (0.0, 1.0, dy), (0.0, 0.0, 1.0)))
+
+
+def scale(sx, sy=None):
+    if sy is None:
+        sy = sx
+    return np.array(((sx, 0.0, 0.0), (0.0, sy, 0.0), (0.0, 0.0, 1.0)))
+
+
+def rotate(degrees, cx=0.0, cy=0.0):
+    a = degrees * math.pi / 180
+    mat = np.array(((math.cos(a), -math.sin(a), cx), (math.sin(a), math.cos(a), cy), (0.0, 0.0, 1.0)))
+    return compose(mat, translate(-cx, -cy))
+
+
+def parse_transform(text, mat=None):
+    """
+    3x3 array of a "transform" attribute composed after [mat], see
+    simpletransform.parseTransform.
+    """
+    mat = identity() if mat is None else mat
+    if not text:
+        return mat
+    text = text.strip()
+    position = 0
+    while position < len(text):
+        result = TRANSFORM.match(text, position)
+        if result is None:
+            raise ValueError('invalid transform: {}'.format(text))
+        name = result.group(1)
+        args = [float(arg) for arg in result.group(2).replace(',', ' ').split()]
+        if name == 'translate':
+            matrix = translate(*args[:2])
+        elif name == 'scale':
+            matrix = scale(*args[:2])
+        elif name == 'rotate':
+            matrix = rotate(*args[:3])
+        elif name == 'skewX':
+            matrix = np.array(((1.0, math.tan(args[0] * math.pi / 180), 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)))
+        elif name == 'skewY':
+            matrix = np.array(((1.0, 0.0, 0.0), (math.tan(args[0] * math.pi / 180), 1.0, 0.0), (0.0, 0.0, 1.0)))
+        else:
+            a, b, c, d, e, f = args
+            matrix = np.array(((a, c, e), (b, d, f), (0.0, 0.0, 1.0)))
+        mat = compose(mat, matrix)
+        position = result.end()
+    return mat
+
+
+def apply(mat, points, out=None):
+    """
+    Apply [mat] to an array of points of any shape (..., 2) in one pass,
+    in place when [out] is the points array.
+    """
+    (a, c, e), (b, d, f) = np.asarray(mat, dtype=float)[:2].tolist()
+    x = points[..., 0]
+    y = points[..., 1]
+    # a * x + c * y + e, summed in that order like applyTransformToPoint;
+    # both rows are computed before [out] is written, it may be [points]
+    tx = x * a
+    tx += y * c
+    tx += e
+    ty = x * b
+    ty += y * d
+    ty += f
+    if out is None:
+        out = np.empty(np.shape(points))
+    out[..., 0] = tx
+    out[..., 1] = ty
+    return out
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import random
+    from .svglib import simpletransform
+
+    # python -m gcode.lib.contour.transform [nodes]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    random.seed(0)
+    for text in ('translate(12.5, -3) rotate(30, 5 5) scale(0.62, -0.62) skewX(10) matrix(1 0.1 0.2 1 3 4)',
+                 'translate(10,20), scale(2)', 'translate(1,2) , scale(2)'):
+        old_mat = simpletransform.parseTransform(text)
+        mat = parse_transform(text)
+        print('parseTransform same: {} ({})'.format(np.array_equal(from_list(old_mat), mat), text))
+
+    path = [[[[random.uniform(0, 500), random.uniform(0, 500)] for _ in range(3)]
+             for _ in range(count // 100)] for _ in range(100)]
+    nodes = np.array(path, dtype=float)
+    t = time.time()
+    simpletransform.applyTransformToPath(old_mat, path)
+    t_old = time.time() - t
+    t = time.time()
+    apply(mat, nodes, out=nodes)
+    t_new = time.time() - t
+    print('{} nodes: applyTransformToPath {:.3f}s, apply {:.3f}s ({:.0f}x), same: {}'.format(
+        count, t_old, t_new, t_old / t_new, np.array_equal(np.array(path), nodes)))
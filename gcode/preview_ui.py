@@ -0,0 +1,243 @@
+#-*- coding: UTF-8 -*-
+
+import math
+import struct
+import numpy as np
+from PyQt5.Qt import QWidget, QPainter, QPainterPath, QPen, QColor, QRectF, QTransform, \
+    QDataStream, QByteArray
+from PyQt5 import QtCore
+
+from .lib.contour import toolpath as tp
+
+# points of the program per chunk, chunks out of the view are not drawn
+CHUNK_POINTS = 20000
+
+# segments drawn for every G2/G3 arc
+ARC_SEGMENTS = 8
+
+# decimation grid (mm) of the finest level of detail, every level doubles it
+MIN_CELL = 0.01
+MAX_LEVEL = 20
+
+
+def array_to_path(points, connect):
+    """
+    QPainterPath of [points], [connect] being 0 for a moveTo and 1 for a lineTo.
+    The path is deserialized from a QDataStream buffer filled by numpy,
+    much faster than a moveTo/lineTo call per point.
+    """
+    data = np.empty(len(points), dtype=[('type', '>i4'), ('x', '>f8'), ('y', '>f8')])
+    data['type'] = connect
+    data['x'] = points[:, 0]
+    data['y'] = points[:, 1]
+    # element count, elements, then cStart and fillRule of QPainterPath
+    buf = struct.pack('>i', len(points)) + data.tobytes() + struct.pack('>ii', 0, 0)
+    path = QPainterPath()
+    QDataStream(QByteArray(buf)) >> path
+    return path
+
+
+def toolpath_points(ops, xy, ij):
+    """
+    Points of a program in order, arcs split in ARC_SEGMENTS chords, and
+    for every point whether it is reached by a pen-up move (home or travel).
+    """
+    rows = np.flatnonzero(np.array(tp.HAS_XY)[ops])
+    row_ops = ops[rows]
+    is_arc = (row_ops == tp.ARC_CW) | (row_ops == tp.ARC_CCW)
+    counts = np.where(is_arc, ARC_SEGMENTS, 1)
+    owner = np.repeat(np.arange(len(rows)), counts)
+    position = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    points = xy[rows][owner]
+
+    arcs = np.flatnonzero(is_arc)
+    if len(arcs):
+        # an arc starts at the point of the previous row having coordinates
+        start = xy[rows[arcs - 1]]
+        end = xy[rows[arcs]]
+        center = start + ij[rows[arcs]]
+        radius = np.hypot(*(start - center).T)
+        a0 = np.arctan2(*(start - center).T[::-1])
+        a1 = np.arctan2(*(end - center).T[::-1])
+        sweep = np.where(row_ops[arcs] == tp.ARC_CW, -((a0 - a1) % (2 * np.pi)), (a1 - a0) % (2 * np.pi))
+        index = np.full(len(rows), -1)
+        index[arcs] = np.arange(len(arcs))
+        sampled = np.flatnonzero(is_arc[owner] & (position < ARC_SEGMENTS - 1))
+        k = index[owner[sampled]]
+        angle = a0[k] + sweep[k] * (position[sampled] + 1) / float(ARC_SEGMENTS)
+        points[sampled, 0] = center[k, 0] + radius[k] * np.cos(angle)
+        points[sampled, 1] = center[k, 1] + radius[k] * np.sin(angle)
+
+    moves = np.isin(row_ops, (tp.HOME, tp.TRAVEL))[owner]
+    return points, moves
+
+
+class ToolpathPreview(QWidget):
+    """
+    Preview of the GCode program: drawing moves in dark, pen-up moves in
+    light red. The program is cut in chunks with bounds, each drawn as two
+    cached QPainterPath per level of detail; a level keeps one point per
+    grid cell about the size of a screen pixel.
+    Wheel to zoom, drag to pan, double click to fit.
+    """
+    def __init__(self, parent=None):
+        super(ToolpathPreview, self).__init__(parent)
+        self.setMinimumSize(240, 180)
+        self.draw_pen = QPen(QColor(20, 20, 20), 0)
+        self.travel_pen = QPen(QColor(230, 120, 120), 0)
+        self.points = None
+        self.moves = None
+        self.chunks = []
+        self.paths = {}
+        self.zoom = 1.0
+        self.center = (0.0, 0.0)
+        self.drag = None
+        # fit the view to the program until the user zooms or pans
+        self.auto_fit = True
+
+    def clear(self):
+        self.points = None
+        self.moves = None
+        self.chunks = []
+        self.paths = {}
+        self.auto_fit = True
+        self.update()
+
+    def set_toolpath(self, ops, xy, ij):
+        """
+        Show a program: its ops with the X/Y and I/J values as rendered
+        (scale and offset applied). The view is fitted to the program
+        unless the user moved it, see auto_fit.
+        """
+        points, moves = toolpath_points(ops, xy, ij)
+        # same orientation as the SVG: the machine X goes up, Y to the left
+        self.points = np.column_stack((-points[:, 1], -points[:, 0]))
+        self.moves = moves
+        self.paths = {}
+
+        starts = np.flatnonzero(moves)
+        if not len(starts) or starts[0] != 0:
+            starts = np.concatenate(([0], starts))
+        bounds = np.unique(starts[np.minimum(np.searchsorted(starts, np.arange(0, len(points), CHUNK_POINTS)),
+                                             len(starts) - 1)])
+        ends = np.append(bounds[1:], len(points))
+        self.chunks = []
+        for begin, end in zip(bounds.tolist(), ends.tolist()):
+            # the pen-up move into the chunk starts in the previous one
+            chunk = self.points[max(begin - 1, 0):end]
+            x_min, y_min = chunk.min(axis=0)
+            x_max, y_max = chunk.max(axis=0)
+            self.chunks.append((begin, end, QRectF(x_min, y_min, x_max - x_min, y_max - y_min)))
+        if self.auto_fit:
+            self.fit()
+        self.update()
+
+    def fit(self):
+        if self.points is None or not len(self.points):
+            return
+        x_min, y_min = self.points.min(axis=0)
+        x_max, y_max = self.points.max(axis=0)
+        self.center = ((x_min + x_max) / 2.0, (y_min + y_max) / 2.0)
+        width = max(x_max - x_min, 1.0)
+        height = max(y_max - y_min, 1.0)
+        self.zoom = 0.9 * min(self.width() / width, self.height() / height)
+        self.update()
+
+    def level(self):
+        """
+        Level of detail whose grid cell is at most a screen pixel.
+        """
+        pixel = 1.0 / self.zoom
+        if pixel <= MIN_CELL:
+            return 0
+        return min(int(math.log(pixel / MIN_CELL, 2)), MAX_LEVEL)
+
+    def chunk_paths(self, level, index):
+        """
+        (drawing path, pen-up path) of a chunk at a level of detail, cached.
+        """
+        key = (level, index)
+        if key not in self.paths:
+            begin, end, _ = self.chunks[index]
+            points = self.points[begin:end]
+            moves = self.moves[begin:end]
+            # chain ends: the point before every pen-up move and the last one
+            last = np.zeros(len(points), dtype=bool)
+            last[:-1] = moves[1:]
+            last[-1] = True
+            keep = moves | last
+            if level > 0:
+                cell = np.floor(points / (MIN_CELL * 2 ** level))
+                keep[1:] |= (cell[1:] != cell[:-1]).any(axis=1)
+            else:
+                keep[:] = True
+            draw = array_to_path(points[keep], np.where(moves[keep], 0, 1))
+
+            starts = np.flatnonzero(moves) + begin
+            starts = starts[starts > 0]
+            travel = np.empty((2 * len(starts), 2))
+            travel[0::2] = self.points[starts - 1]
+            travel[1::2] = self.points[starts]
+            connect = np.tile((0, 1), len(starts))
+            self.paths[key] = (draw, array_to_path(travel, connect))
+        return self.paths[key]
+
+    def view_transform(self):
+        transform = QTransform()
+        transform.translate(self.width() / 2.0, self.height() / 2.0)
+        transform.scale(self.zoom, self.zoom)
+        transform.translate(-self.center[0], -self.center[1])
+        return transform
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(255, 255, 255))
+        if self.points is None or not len(self.points):
+            return
+        transform = self.view_transform()
+        visible = transform.inverted()[0].mapRect(QRectF(self.rect()))
+        painter.setTransform(transform)
+        level = self.level()
+        for index, (_, _, bounds) in enumerate(self.chunks):
+            # compared by hand, QRectF.intersects fails on flat bounds
+            if bounds.left() > visible.right() or bounds.right() < visible.left() or \
+                    bounds.top() > visible.bottom() or bounds.bottom() < visible.top():
+                continue
+            draw, travel = self.chunk_paths(level, index)
+            painter.setPen(self.travel_pen)
+            painter.drawPath(travel)
+            painter.setPen(self.draw_pen)
+            painter.drawPath(draw)
+
+    def wheelEvent(self, event):
+        factor = 1.25 ** (event.angleDelta().y() / 120.0)
+        # keep the point under the cursor in place
+        pos = event.pos()
+        before = self.view_transform().inverted()[0].map(QtCore.QPointF(pos))
+        self.zoom *= factor
+        after = self.view_transform().inverted()[0].map(QtCore.QPointF(pos))
+        self.center = (self.center[0] + before.x() - after.x(), self.center[1] + before.y() - after.y())
+        self.auto_fit = False
+        self.update()
+
+    def mousePressEvent(self, event):
+        self.drag = event.pos()
+
+    def mouseMoveEvent(self, event):
+        if self.drag is not None:
+            delta = event.pos() - self.drag
+            self.drag = event.pos()
+            self.center = (self.center[0] - delta.x() / self.zoom, self.center[1] - delta.y() / self.zoom)
+            self.auto_fit = False
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.auto_fit = True
+        self.fit()
+
+    def resizeEvent(self, event):
+        if self.auto_fit:
+            self.fit()
@@ -0,0 +1,196 @@
+#-*- coding: UTF-8 -*-
+
+from collections import OrderedDict
+import numpy as np
+from PyQt5.Qt import QWidget, QVBoxLayout, QHBoxLayout, QTableView, QHeaderView, QLineEdit, QPushButton, QSpinBox, \
+    QLabel, QAction, QApplication, QFontDatabase, QKeySequence, QAbstractItemView
+from PyQt5 import QtCore
+
+# lines per chunk of the search index
+CHUNK_LINES = 4096
+
+# rendered chunks kept by the search index, the least recently used go first
+MAX_CHUNKS = 256
+
+
+class LinesModel(QtCore.QAbstractTableModel):
+    """
+    Read-only one column model over a sequence of lines (a list or a
+    toolpath.Lines), a line is only materialized when the view asks for it.
+    Line numbers are the vertical header.
+    """
+    def __init__(self, parent=None):
+        super(LinesModel, self).__init__(parent)
+        self.lines = []
+        self.count = 0
+
+    def set_lines(self, lines):
+        self.beginResetModel()
+        self.lines = lines
+        self.count = len(lines)
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.count
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 1
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and index.isValid():
+            return self.lines[index.row()]
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Vertical:
+            return section + 1
+        return None
+
+
+class LineIndex(object):
+    """
+    Case-insensitive search over the lines by chunks of CHUNK_LINES: the text
+    of a chunk and the offset of each of its lines, a match is mapped back to
+    its line with a binary search. Chunks are rendered when first searched.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.chunks = OrderedDict()
+
+    def chunk(self, index):
+        if index in self.chunks:
+            # most recently used last
+            self.chunks[index] = self.chunks.pop(index)
+            return self.chunks[index]
+        start = index * CHUNK_LINES
+        lines = self.lines[start:start + CHUNK_LINES]
+        offsets = np.cumsum([0] + [len(line) + 1 for line in lines[:-1]])
+        self.chunks[index] = ('\n'.join(lines).lower(), offsets)
+        if len(self.chunks) > MAX_CHUNKS:
+            self.chunks.popitem(last=False)
+        return self.chunks[index]
+
+    def find(self, text, start=0):
+        """
+        First line from [start] containing [text], wrapping around at the
+        end, -1 if there is none.
+        """
+        count = len(self.lines)
+        text = text.lower()
+        if not count or not text or '\n' in text:
+            return -1
+        start = min(max(start, 0), count - 1)
+        chunks = (count + CHUNK_LINES - 1) // CHUNK_LINES
+        first = start // CHUNK_LINES
+        # the first chunk is searched twice: from the start line, then up to it
+        for n in range(chunks + 1):
+            index = (first + n) % chunks
+            body, offsets = self.chunk(index)
+            begin = offsets[start - first * CHUNK_LINES] if n == 0 else 0
+            position = body.find(text, begin)
+            if position < 0:
+                continue
+            line = index * CHUNK_LINES + int(np.searchsorted(offsets, position, side='right')) - 1
+            if n == chunks and line >= start:
+                return -1
+            return line
+        return -1
+
+
+class GcodeTextView(QWidget):
+    """
+    Virtualized read-only view of a GCode program: only the visible lines
+    are rendered, from a list of lines or a toolpath.Lines. Jump to a line
+    with the spinbox, search with the find box (Enter for the next match).
+    """
+    def __init__(self, parent=None):
+        super(GcodeTextView, self).__init__(parent)
+        self.index = LineIndex([])
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        bar = QHBoxLayout()
+        layout.addLayout(bar)
+
+        bar.addWidget(QLabel('Line:'))
+        self.spinbox_line = QSpinBox()
+        self.spinbox_line.setRange(1, 1)
+        self.spinbox_line.setKeyboardTracking(False)
+        self.spinbox_line.valueChanged.connect(lambda value: self.go_to(value - 1))
+        bar.addWidget(self.spinbox_line)
+
+        self.line_find = QLineEdit()
+        self.line_find.setPlaceholderText('Find')
+        self.line_find.returnPressed.connect(self.find_next)
+        bar.addWidget(self.line_find)
+        self.btn_find = QPushButton('Find')
+        self.btn_find.clicked.connect(self.find_next)
+        bar.addWidget(self.btn_find)
+
+        self.label_lines = QLabel('0 lines')
+        bar.addWidget(self.label_lines)
+        bar.addStretch()
+
+        self.model = LinesModel(self)
+        self.table_view = QTableView()
+        self.table_view.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        # fixed height rows: the view never measures the lines, unlike
+        # QListView which lays out every row on a model reset
+        rows = self.table_view.verticalHeader()
+        rows.setSectionResizeMode(QHeaderView.Fixed)
+        rows.setDefaultSectionSize(self.table_view.fontMetrics().height() + 2)
+        self.table_view.horizontalHeader().hide()
+        self.table_view.horizontalHeader().setStretchLastSection(True)
+        self.table_view.setShowGrid(False)
+        self.table_view.setWordWrap(False)
+        self.table_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table_view.setModel(self.model)
+        self.table_view.selectionModel().currentRowChanged.connect(self.current_row_changed)
+        copy_action = QAction(self.table_view)
+        copy_action.setShortcut(QKeySequence.Copy)
+        copy_action.setShortcutContext(QtCore.Qt.WidgetShortcut)
+        copy_action.triggered.connect(self.copy)
+        self.table_view.addAction(copy_action)
+        layout.addWidget(self.table_view)
+
+    def set_lines(self, lines):
+        """
+        Show [lines], a sequence supporting len, indexing and slicing.
+        """
+        self.model.set_lines(lines)
+        self.index = LineIndex(lines)
+        self.spinbox_line.blockSignals(True)
+        self.spinbox_line.setRange(1, max(len(lines), 1))
+        self.spinbox_line.setValue(1)
+        self.spinbox_line.blockSignals(False)
+        self.label_lines.setText('{} lines'.format(len(lines)))
+
+    def clear(self):
+        self.set_lines([])
+
+    def go_to(self, line):
+        if not 0 <= line < self.model.rowCount():
+            return
+        index = self.model.index(line, 0)
+        self.table_view.setCurrentIndex(index)
+        self.table_view.scrollTo(index, QAbstractItemView.PositionAtCenter)
+
+    def find_next(self):
+        current = self.table_view.currentIndex()
+        start = current.row() + 1 if current.isValid() else 0
+        line = self.index.find(self.line_find.text(), start % max(self.model.rowCount(), 1))
+        if line >= 0:
+            self.go_to(line)
+
+    def current_row_changed(self, current, previous):
+        if current.isValid():
+            self.spinbox_line.blockSignals(True)
+            self.spinbox_line.setValue(current.row() + 1)
+            self.spinbox_line.blockSignals(False)
+
+    def copy(self):
+        rows = sorted(index.row() for index in self.table_view.selectionModel().selectedIndexes())
+        if rows:
+            QApplication.clipboard().setText('\n'.join(self.model.lines[row] for row in rows))
@@ -8,6 +8,7 @@
 
 import os
 import sys
+import multiprocessing
 from PyQt5.Qt import QApplication, QWidget, QIcon, QPixmap
 from PyQt5.QtCore import QThread
 from ui import UFDebugToolUI
@@ -88,6 +89,8 @@ class UFDebugTool(QWidget):
 
     def closeEvent(self, event):
         self.log_window.close()
+        # write the reports still in the recorder rings
+        self.ui.xarm_ui.handler.stop_recording()
         super(UFDebugTool, self).closeEvent(event)
 
     def show(self):
@@ -109,4 +112,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # the G-code conversion may start worker processes, needed once frozen
+    multiprocessing.freeze_support()
     main()
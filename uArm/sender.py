@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2018, UFACTORY, Inc.
+# All rights reserved.
+#
+# Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
+
+import time
+import functools
+import threading
+from PyQt5.Qt import QThread
+from PyQt5.QtCore import pyqtSignal
+
+# commands sent ahead of their ack, the firmware plans the next moves while
+# the current one runs instead of waiting for every round trip
+WINDOW = 4
+
+# seconds between two progress reports
+REPORT_INTERVAL = 0.2
+
+# seconds an ack is waited for, a command lost on the way would hold its
+# window slot for good
+TIMEOUT = 30
+
+# lines rendered at once to count the commands
+COUNT_CHUNK = 10000
+
+
+class GcodeSender(QThread):
+    """
+    Stream GCode lines to a uArm (SwiftAPI) with at most [window] commands
+    waiting for their ack. [lines] is any sequence of lines, a list or a
+    toolpath.Lines rendered as it is sent.
+    progress reports {'sent', 'acked', 'errors', 'total', 'rate', 'elapsed'},
+    rate being the acked lines per second and total the number of commands,
+    the lines without the blank and comment ones; done reports the same at
+    the end, plus 'stopped' and 'error', the message of the send that failed
+    or None. Commands without an ack after [timeout] seconds
+    are given up: counted as acked and as errors.
+    """
+    progress = pyqtSignal(dict)
+    done = pyqtSignal(dict)
+
+    def __init__(self, arm, lines, window=WINDOW, timeout=TIMEOUT):
+        super(GcodeSender, self).__init__()
+        self.arm = arm
+        self.lines = lines
+        self.window = window
+        self.timeout = timeout
+        self.slots = threading.Semaphore(window)
+        self.running = threading.Event()
+        self.running.set()
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        # message of the send that failed, it stops the sending
+        self.error = None
+        # sent commands waiting for their ack: number: deadline
+        self.pending = {}
+        # counted by run, the lines are rendered in the thread
+        self.total = 0
+        # time spent paused, left out of the rate
+        self.paused_time = 0.0
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    @property
+    def paused(self):
+        return not self.running.is_set()
+
+    def stop(self):
+        self.stopped = True
+        self.running.set()
+
+    def ack(self, number, ret):
+        # called by the SwiftAPI receive thread
+        with self.lock:
+            if self.pending.pop(number, None) is None:
+                # given up already, see expire
+                return
+            self.acked += 1
+            if not (isinstance(ret, (list, tuple)) and ret and ret[0] == 'OK'):
+                self.errors += 1
+        self.slots.release()
+
+    def report(self, start):
+        elapsed = time.time() - start - self.paused_time
+        with self.lock:
+            acked, errors = self.acked, self.errors
+        return {
+            'sent': self.sent,
+            'acked': acked,
+            'errors': errors,
+            'total': self.total,
+            'rate': acked / elapsed if elapsed > 0 else 0.0,
+            'elapsed': elapsed,
+        }
+
+    def count_commands(self):
+        """
+        Number of lines to send: without the blank and comment lines.
+        """
+        count = 0
+        for start in range(0, len(self.lines), COUNT_CHUNK):
+            count += sum(1 for line in self.lines[start:start + COUNT_CHUNK] if line.split(';')[0].strip())
+        return count
+
+    def expire(self):
+        """
+        Give up the commands waiting for their ack for more than [timeout]
+        seconds, releasing their slot.
+        """
+        now = time.time()
+        with self.lock:
+            expired = [number for number, deadline in self.pending.items() if deadline < now]
+            for number in expired:
+                del self.pending[number]
+            self.acked += len(expired)
+            self.errors += len(expired)
+        for _ in expired:
+            self.slots.release()
+
+    def wait_slot(self):
+        """
+        Take a window slot, False if stopped or disconnected meanwhile.
+        """
+        while not self.slots.acquire(timeout=0.1):
+            if self.stopped or not self.arm.connected:
+                return False
+            self.expire()
+        return True
+
+    def run(self):
+        self.total = self.count_commands()
+        start = time.time()
+        self.progress.emit(self.report(start))
+        last_report = time.time()
+        complete = False
+        for index in range(len(self.lines)):
+            line = self.lines[index].split(';')[0].strip()
+            if not line:
+                continue
+            if not self.running.is_set():
+                paused = time.time()
+                self.progress.emit(self.report(start))
+                self.running.wait()
+                self.paused_time += time.time() - paused
+            if self.stopped or not self.arm.connected or not self.wait_slot():
+                break
+            number = self.sent
+            with self.lock:
+                self.pending[number] = time.time() + self.timeout
+            try:
+                self.arm.send_cmd_async(line, timeout=self.timeout, callback=functools.partial(self.ack, number))
+            except Exception as e:
+                self.error = str(e)
+                with self.lock:
+                    del self.pending[number]
+                    self.errors += 1
+                self.slots.release()
+                break
+            self.sent += 1
+            if time.time() - last_report >= REPORT_INTERVAL:
+                last_report = time.time()
+                self.progress.emit(self.report(start))
+        else:
+            complete = True
+
+        # wait for the acks of the commands still in the window
+        for _ in range(self.window):
+            if not self.wait_slot():
+                break
+        result = self.report(start)
+        result['stopped'] = not complete or result['acked'] < result['sent']
+        result['error'] = self.error
+        self.done.emit(result)
@@ -9,7 +9,9 @@
 import functools
 import threading
 from PyQt5.QtCore import Qt
-from PyQt5.Qt import QFrame, QGridLayout, QLabel, QSlider, QDoubleSpinBox
+from PyQt5.Qt import QFrame, QGridLayout, QLabel, QSlider, QDoubleSpinBox, QTimer
+
+from .report import FrameCounter
 
 
 class CartesianUI(object):
@@ -17,17 +19,23 @@ class CartesianUI(object):
         self.main_ui = ui
         self.p_layout = layout
         super(CartesianUI, self).__init__()
+        # deadband: smallest change of a reported value that is redrawn
         self.cartesians = [
-            {'name': 'x', 'default': 201.5, 'range': [-900.0, 900.0]},
-            {'name': 'y', 'default': 0.0, 'range': [-900.0, 900.0]},
-            {'name': 'z', 'default': 140.5, 'range': [-900.0, 900.0]},
-            {'name': 'roll', 'default': -180.0, 'range': [-180.0, 180.0]},
-            {'name': 'yaw', 'default': 0.0, 'range': [-180.0, 180.0]},
-            {'name': 'pitch', 'default': 0.0, 'range': [-180.0, 180.0]},
-            {'name': 'radius', 'default': -1.0, 'range': [-1.0, 900.0]},
+            {'name': 'x', 'default': 201.5, 'range': [-900.0, 900.0], 'deadband': 0.05},
+            {'name': 'y', 'default': 0.0, 'range': [-900.0, 900.0], 'deadband': 0.05},
+            {'name': 'z', 'default': 140.5, 'range': [-900.0, 900.0], 'deadband': 0.05},
+            {'name': 'roll', 'default': -180.0, 'range': [-180.0, 180.0], 'deadband': 0.05},
+            {'name': 'yaw', 'default': 0.0, 'range': [-180.0, 180.0], 'deadband': 0.05},
+            {'name': 'pitch', 'default': 0.0, 'range': [-180.0, 180.0], 'deadband': 0.05},
+            {'name': 'radius', 'default': -1.0, 'range': [-1.0, 900.0], 'deadband': 0.05},
         ]
         self.flag_lock = threading.Lock()
         self.cartesians_flag = [False] * 7
+        # widgets by axis and the values they show, see update_cartesians
+        self.sliders = []
+        self.spinboxes = []
+        self.shown = [cartesian['default'] for cartesian in self.cartesians]
+        self.frames = FrameCounter()
         self.set_ui()
 
     def set_ui(self):
@@ -65,11 +73,22 @@ class CartesianUI(object):
             layout.addWidget(label, i, 0)
             layout.addWidget(slider, i, 1)
             layout.addWidget(spinbox, i, 2)
+            self.sliders.append(slider)
+            self.spinboxes.append(spinbox)
+
+        self.label_fps = QLabel('FPS: 0.0')
+        layout.addWidget(self.label_fps, len(self.cartesians), 0, 1, 2)
+        self.fps_timer = QTimer()
+        self.fps_timer.timeout.connect(lambda: self.label_fps.setText('FPS: {:.1f}'.format(self.frames.update())))
+        self.fps_timer.start(1000)
 
     def set_flag(self, event, index=0, source=None):
         try:
             with self.flag_lock:
                 self.cartesians_flag[index] = True
+            # edited by hand, the next report is shown whatever its value
+            self.shown[index] = None
+            self.main_ui.handler.last_location = None
             source(event)
         except Exception as e:
             print(e)
@@ -83,13 +102,28 @@ class CartesianUI(object):
             print(e)
 
     def update_cartesians(self, cartesians):
-        # print(cartesians)
-        for i in range(len(cartesians)):
+        """
+        Show the reported position, see JointUI.update_joints.
+        """
+        redraw = False
+        for i, value in enumerate(cartesians[:len(self.spinboxes)]):
             try:
-                if self.cartesians_flag[i] is False and getattr(self, 'spinbox_{}'.format(self.cartesians[i]['name'])).value() != cartesians[i]:
-                    getattr(self, 'spinbox_{}'.format(self.cartesians[i]['name'])).setValue(cartesians[i])
+                if self.cartesians_flag[i] or (self.shown[i] is not None and
+                                              abs(value - self.shown[i]) < self.cartesians[i]['deadband']):
+                    continue
+                spinbox, slider = self.spinboxes[i], self.sliders[i]
+                spinbox.blockSignals(True)
+                slider.blockSignals(True)
+                spinbox.setValue(value)
+                slider.setValue(int(round(value * 10)))
+                spinbox.blockSignals(False)
+                slider.blockSignals(False)
+                self.shown[i] = value
+                redraw = True
             except:
                 pass
+        if redraw:
+            self.frames.tick()
 
     def set_position(self, event, index=0, source=None):
         try:
@@ -10,20 +10,23 @@ import sys
 import time
 import threading
 import queue
-from PyQt5.Qt import QThread
+from PyQt5.Qt import QThread, QTimer
 from PyQt5.QtCore import pyqtSignal
 
 from xarm.wrapper import XArmAPI
 from xarm.core.config import x2_config
 from xarm.x3.error import ServoError, ControlError, ControlWarn
 
+from .report import ReportChannel, FRAME_RATE, location_values
+from .recorder import Recorder
+from .plot_ui import History
+
 sys.path.append('..')
 from log import logger
 
 lock = threading.Lock()
 on_init = False
 
-RAD_DEGREE = 57.295779513082320876798154814105
 TCP_OR_JOINT_LIMIT = -6
 
 
@@ -72,10 +75,20 @@ class XArmHandler(object):
         self.cmd_thread.start()
         # threading.Thread(target=self._handle_cmd_thread, daemon=True).start()
 
-        self.report_que = queue.Queue()
-        self.report_thread = XArmThread(self.report_que)
-        self.report_thread.signal.connect(self.update_ui)
-        self.report_thread.start()
+        # location reports come faster than the GUI can draw them, only the
+        # newest one is shown; events (error, connect) are all handled
+        self.report_channel = ReportChannel(latest=('location', 'cmdnum', 'state', 'brake'))
+        self.report_timer = QTimer()
+        self.report_timer.timeout.connect(self.take_reports)
+        self.report_timer.start(1000 // FRAME_RATE)
+        # report counters when last logged, see log_report_counters
+        self.logged_counters = None
+        # raw values of the last location report, see report_location_callback
+        self.last_location = None
+        # telemetry recorder of the reports, see start_recording
+        self.recorder = None
+        # last minutes of reports for the strip chart
+        self.history = History()
 
     def run_cmd(self, item):
         try:
@@ -106,6 +119,7 @@ class XArmHandler(object):
     def connnect_thread(self, addr, report_type):
         try:
             self.addr = addr
+            self.last_location = None
             self.xarm = XArmAPI(port=addr,
                                 enable_heartbeat=True,
                                 enable_report=True,
@@ -123,12 +137,9 @@ class XArmHandler(object):
             self.report_type = report_type
             return True
         except Exception as e:
-            self.report_que.put({
-                'type': 'connect',
-                'item': {
-                    'mainConnected': False,
-                    'reportConnected': False
-                }
+            self.report_channel.put('connect', {
+                'mainConnected': False,
+                'reportConnected': False
             })
 
     def disconnect(self):
@@ -139,6 +150,16 @@ class XArmHandler(object):
         except Exception as e:
             print(e)
 
+    def take_reports(self):
+        for report_type, item in self.report_channel.take():
+            try:
+                self.update_ui({
+                    'type': report_type,
+                    'item': item
+                })
+            except Exception as e:
+                print(e)
+
     def update_ui(self, data):
         item = data['item']
         if data['type'] == 'brake':
@@ -180,6 +201,8 @@ class XArmHandler(object):
             self.ui.update_state(state)
         elif data['type'] == 'connect':
             self.ui.update_connect_status([item['mainConnected'], item['reportConnected']])
+            if not item['mainConnected']:
+                self.log_report_counters()
         elif data['type'] == 'location':
             pos = item['position']
             angles = item['angles']
@@ -189,51 +212,83 @@ class XArmHandler(object):
             cmdnum = item['cmdnum']
             self.ui.update_cmd_count(cmdnum)
 
+    def log_report_counters(self):
+        """
+        Log the reports received and dropped (replaced before the GUI took
+        them) by type since the start, once per change.
+        """
+        received, dropped = self.report_channel.counters()
+        # the disconnection reports themselves are not a change
+        counters = {report_type: count for report_type, count in received.items() if report_type != 'connect'}
+        if not counters or counters == self.logged_counters:
+            return
+        self.logged_counters = counters
+        logger.info('reports received/dropped: {}'.format(', '.join(
+            '{} {}/{}'.format(report_type, count, dropped.get(report_type, 0))
+            for report_type, count in sorted(received.items()))))
+
+    def start_recording(self, directory):
+        self.stop_recording()
+        self.recorder = Recorder(directory)
+        self.recorder.start()
+        logger.info('record reports to {}'.format(directory))
+
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        recorder, self.recorder = self.recorder, None
+        recorder.stop()
+        recorded, lost = recorder.counters()
+        logger.info('recorded {} reports to {}, lost: {}'.format(
+            sum(recorded.values()), recorder.directory, sum(lost.values())))
+
+    def record(self, stream, *values):
+        recorder = self.recorder
+        if recorder is not None:
+            try:
+                recorder.record(stream, *values)
+            except Exception as e:
+                print(e)
+
     def report_state_callback(self, item):
-        self.report_que.put({
-            'type': 'state',
-            'item': item
-        })
+        self.record('state', item['state'])
+        self.report_channel.put('state', item)
 
     def report_cmdnum_callback(self, item):
-        self.report_que.put({
-            'type': 'cmdnum',
-            'item': item
-        })
+        self.record('cmdnum', item['cmdnum'])
+        self.history.add_cmdnum(item['cmdnum'])
+        self.report_channel.put('cmdnum', item)
 
     def report_connected_callback(self, item):
-        self.report_que.put({
-            'type': 'connect',
-            'item': item
-        })
+        self.report_channel.put('connect', item)
 
     def report_location_callback(self, item):
         try:
-            pos = item['cartesian']
-            angles = item['joints']
+            pos = tuple(item['cartesian'])
+            angles = tuple(item['joints'])
+            self.record('location', pos, angles)
+            self.history.add_location(pos, angles)
+            # reports keep coming while the robot stands still
+            if (pos, angles) == self.last_location:
+                return
+            self.last_location = (pos, angles)
+            position, angles = location_values(pos, angles)
             location = {
-                'position': [float('{:.1f}'.format(p * RAD_DEGREE)) if 2 < i < 6 else float('{:.1f}'.format(p)) for i, p in enumerate(pos)],
-                'angles': [float('{:.1f}'.format(angle * RAD_DEGREE)) for angle in angles],
+                'position': position,
+                'angles': angles,
             }
-            self.report_que.put({
-                'type': 'location',
-                'item': location
-            })
+            self.report_channel.put('location', location)
         except Exception as e:
             print(e)
             pass
 
     def report_brake_callback(self, item):
-        self.report_que.put({
-            'type': 'brake',
-            'item': item
-        })
+        self.record('brake', item['maable'], item['mtbrake'])
+        self.report_channel.put('brake', item)
 
     def report_warn_error_callback(self, item):
-        self.report_que.put({
-            'type': 'error',
-            'item': item
-        })
+        self.record('error', item['errorCode'], item['warnCode'])
+        self.report_channel.put('error', item)
 
     def get_servo_debug_msg(self, only_log_error_servo=True):
         if self.ui.main_ui.window.log_window.isHidden():
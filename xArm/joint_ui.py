@@ -9,7 +9,9 @@
 import threading
 import functools
 from PyQt5.QtCore import Qt
-from PyQt5.Qt import QFrame, QGridLayout, QSlider, QDoubleSpinBox, QCheckBox, QMessageBox
+from PyQt5.Qt import QFrame, QGridLayout, QLabel, QSlider, QDoubleSpinBox, QCheckBox, QMessageBox, QTimer
+
+from .report import FrameCounter
 
 
 class JointUI(object):
@@ -17,17 +19,24 @@ class JointUI(object):
         self.main_ui = ui
         self.p_layout = layout
         super(JointUI, self).__init__()
+        # deadband: smallest change of a reported angle that is redrawn
         self.joints = [
-            {'name': 'axis_1', 'default': 0.0, 'range': [-179.9, 179.9]},
-            {'name': 'axis_2', 'default': 0.0, 'range': [-179.9, 179.9]},
-            {'name': 'axis_3', 'default': 0.0, 'range': [-179.9, 179.9]},
-            {'name': 'axis_4', 'default': 0.0, 'range': [-179.9, 179.9]},
-            {'name': 'axis_5', 'default': 0.0, 'range': [-179.9, 179.9]},
-            {'name': 'axis_6', 'default': 0.0, 'range': [-179.9, 179.9]},
-            {'name': 'axis_7', 'default': 0.0, 'range': [-179.9, 179.9]},
+            {'name': 'axis_1', 'default': 0.0, 'range': [-179.9, 179.9], 'deadband': 0.05},
+            {'name': 'axis_2', 'default': 0.0, 'range': [-179.9, 179.9], 'deadband': 0.05},
+            {'name': 'axis_3', 'default': 0.0, 'range': [-179.9, 179.9], 'deadband': 0.05},
+            {'name': 'axis_4', 'default': 0.0, 'range': [-179.9, 179.9], 'deadband': 0.05},
+            {'name': 'axis_5', 'default': 0.0, 'range': [-179.9, 179.9], 'deadband': 0.05},
+            {'name': 'axis_6', 'default': 0.0, 'range': [-179.9, 179.9], 'deadband': 0.05},
+            {'name': 'axis_7', 'default': 0.0, 'range': [-179.9, 179.9], 'deadband': 0.05},
         ]
         self.flag_lock = threading.Lock()
         self.joints_flag = [False] * 7
+        # widgets by axis and the angles they show, see update_joints
+        self.checkboxes = []
+        self.sliders = []
+        self.spinboxes = []
+        self.shown = [joint['default'] for joint in self.joints]
+        self.frames = FrameCounter()
         self.set_ui()
 
     def set_ui(self):
@@ -68,11 +77,23 @@ class JointUI(object):
             layout.addWidget(checkbox, i, 0)
             layout.addWidget(slider, i, 1)
             layout.addWidget(spinbox, i, 2)
+            self.checkboxes.append(checkbox)
+            self.sliders.append(slider)
+            self.spinboxes.append(spinbox)
+
+        self.label_fps = QLabel('FPS: 0.0')
+        layout.addWidget(self.label_fps, len(self.joints), 0)
+        self.fps_timer = QTimer()
+        self.fps_timer.timeout.connect(lambda: self.label_fps.setText('FPS: {:.1f}'.format(self.frames.update())))
+        self.fps_timer.start(1000)
 
     def set_flag(self, event, index=0, source=None):
         try:
             with self.flag_lock:
                 self.joints_flag[index] = True
+            # edited by hand, the next report is shown whatever its value
+            self.shown[index] = None
+            self.main_ui.handler.last_location = None
             source(event)
         except Exception as e:
             print(e)
@@ -86,12 +107,30 @@ class JointUI(object):
             print(e)
 
     def update_joints(self, angles):
-        for i in range(len(angles)):
+        """
+        Show the reported angles, the axes moved less than their deadband are
+        left alone. Signals are blocked: the slider is set along with the
+        spinbox instead of through slider_spinbox_related.
+        """
+        redraw = False
+        for i, angle in enumerate(angles[:len(self.spinboxes)]):
             try:
-                if self.joints_flag[i] is False and getattr(self, 'spinbox_{}'.format(self.joints[i]['name'])).value() != angles[i]:
-                    getattr(self, 'spinbox_{}'.format(self.joints[i]['name'])).setValue(angles[i])
+                if self.joints_flag[i] or (self.shown[i] is not None and
+                                           abs(angle - self.shown[i]) < self.joints[i]['deadband']):
+                    continue
+                spinbox, slider = self.spinboxes[i], self.sliders[i]
+                spinbox.blockSignals(True)
+                slider.blockSignals(True)
+                spinbox.setValue(angle)
+                slider.setValue(int(round(angle * 10)))
+                spinbox.blockSignals(False)
+                slider.blockSignals(False)
+                self.shown[i] = angle
+                redraw = True
             except Exception as e:
                 print(e)
+        if redraw:
+            self.frames.tick()
 
     def brake_changed_callback(self, brakes):
         try:
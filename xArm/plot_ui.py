@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2018, UFACTORY, Inc.
+# All rights reserved.
+#
+# Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
+
+import time
+import numpy as np
+from PyQt5.Qt import QWidget, QPainter, QPen, QColor, QTimer
+
+from gcode.preview_ui import array_to_path
+from .recorder import Ring, STREAMS
+from .report import FRAME_RATE, RAD_DEGREE
+
+# seconds of reports on the chart
+WINDOW = 600.0
+
+# samples kept, a power of two: 17 minutes of location reports at 250Hz
+CAPACITY = 1 << 18
+
+COLORS = [QColor(31, 119, 180), QColor(255, 127, 14), QColor(44, 160, 44), QColor(214, 39, 40),
+          QColor(148, 103, 189), QColor(140, 86, 75), QColor(227, 119, 194)]
+
+
+def decimate(columns, low, high):
+    """
+    Min of [low] and max of [high] (samples, traces) per pixel column,
+    [columns] being the nondecreasing pixel column of every sample.
+    Return (column, low, high) per pixel column having samples.
+    """
+    starts = np.flatnonzero(np.diff(columns, prepend=columns[0] - 1))
+    return columns[starts], np.minimum.reduceat(low, starts), np.maximum.reduceat(high, starts)
+
+
+class History(object):
+    """
+    Reports of the last minutes for the chart, in rings written by the SDK
+    callbacks (see recorder.Ring) and read by the GUI without a copy.
+    """
+    def __init__(self, capacity=CAPACITY):
+        self.location = Ring(STREAMS['location'], capacity)
+        # the command count changes at most once per command
+        self.cmdnum = Ring(STREAMS['cmdnum'], capacity >> 2)
+
+    def add_location(self, pos, angles):
+        self.location.append(time.time(), (pos, angles))
+
+    def add_cmdnum(self, cmdnum):
+        self.cmdnum.append(time.time(), (cmdnum,))
+
+
+class StripChart(QWidget):
+    """
+    Strip chart of the History over the last WINDOW seconds, one lane per
+    group of traces: joint angles, TCP position and command count.
+    Every trace is drawn as the min/max of its samples per pixel column,
+    so a frame costs about the same for a few samples or a full window.
+    Redrawn by a timer at FRAME_RATE while visible.
+    """
+    def __init__(self, history, parent=None):
+        super(StripChart, self).__init__(parent)
+        self.setMinimumSize(320, 240)
+        self.history = history
+        self.window = WINDOW
+        # name, ring, column, columns of the column, scale
+        self.lanes = [
+            ('Joints (deg)', history.location, 1, slice(0, 7), RAD_DEGREE),
+            ('TCP (mm)', history.location, 0, slice(0, 3), 1.0),
+            ('CmdCount', history.cmdnum, 0, slice(None), 1.0),
+        ]
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.frame)
+        self.timer.start(1000 // FRAME_RATE)
+
+    def frame(self):
+        if self.isVisible():
+            self.update()
+
+    def window_runs(self, ring, width, now):
+        """
+        Samples of [ring] in the window by segment of the ring: (slice of
+        the samples, pixel column of every run of samples, run starts).
+        The segments are read in place, the writer only adds rows after them.
+        """
+        t0 = now - self.window
+        runs = []
+        for piece in ring.segments(ring.capacity):
+            times = ring.time[piece]
+            first = int(np.searchsorted(times, t0))
+            if first == len(times):
+                continue
+            columns = ((times[first:] - t0) * (width / self.window)).astype(int)
+            np.clip(columns, 0, width - 1, out=columns)
+            starts = np.flatnonzero(np.diff(columns, prepend=columns[0] - 1))
+            runs.append((slice(piece.start + first, piece.stop), columns[starts], starts))
+        return runs
+
+    def lane_data(self, ring, column, traces, width, runs):
+        """
+        (x, low, high) of a lane over the pixel columns [0, width) from the
+        window_runs of its ring, None without samples. The newest values are
+        drawn on to the right edge.
+        """
+        if not runs:
+            return None
+        parts = []
+        for piece, x, starts in runs:
+            values = ring.columns[column][piece]
+            if values.ndim == 1:
+                values = values[:, None]
+            values = values[:, traces]
+            parts.append((x, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)))
+        latest = values[-1:]
+        x, low, high = [np.concatenate(arrays) for arrays in zip(*parts)]
+        if len(parts) > 1:
+            # a pixel column may straddle the two segments
+            x, low, high = decimate(x, low, high)
+        x = np.append(x, width - 1)
+        low = np.vstack((low, latest)).astype(float)
+        high = np.vstack((high, latest)).astype(float)
+        return x, low, high
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(255, 255, 255))
+        width = max(self.width(), 2)
+        height = self.height() / float(len(self.lanes))
+        now = time.time()
+        # lanes of the same ring share its pixel columns
+        runs = {}
+        for index, (name, ring, column, traces, scale) in enumerate(self.lanes):
+            top = index * height
+            painter.setPen(QPen(QColor(200, 200, 200), 0))
+            painter.drawLine(0, int(top + height) - 1, width, int(top + height) - 1)
+            try:
+                if id(ring) not in runs:
+                    runs[id(ring)] = self.window_runs(ring, width, now)
+                data = self.lane_data(ring, column, traces, width, runs[id(ring)])
+            except Exception as e:
+                print(e)
+                data = None
+            if data is None:
+                painter.setPen(QColor(100, 100, 100))
+                painter.drawText(4, int(top) + 14, name)
+                continue
+            x, low, high = data
+            low *= scale
+            high *= scale
+            y_min, y_max = low.min(), high.max()
+            span = max(y_max - y_min, 1e-6)
+            # 16px for the title, 4px margin at the bottom
+            y_scale = (height - 20) / span
+            base = top + height - 4
+            for trace in range(low.shape[1]):
+                # (x, low), (x, high) per pixel column, drawn as one polyline
+                points = np.empty((2 * len(x), 2))
+                points[:, 0] = np.repeat(x, 2)
+                points[0::2, 1] = base - (low[:, trace] - y_min) * y_scale
+                points[1::2, 1] = base - (high[:, trace] - y_min) * y_scale
+                connect = np.ones(len(points), dtype=int)
+                connect[0] = 0
+                painter.setPen(QPen(COLORS[trace % len(COLORS)], 0))
+                painter.drawPath(array_to_path(points, connect))
+            painter.setPen(QColor(100, 100, 100))
+            painter.drawText(4, int(top) + 14, '{}: {:.1f} .. {:.1f}'.format(name, y_min, y_max))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2018, UFACTORY, Inc.
+# All rights reserved.
+#
+# Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
+
+import os
+import glob
+import time
+import threading
+import numpy as np
+
+# samples of a stream kept between two flushes, a power of two: about two
+# minutes of location reports at 250Hz
+CAPACITY = 1 << 15
+
+# seconds between two flushes to the files
+FLUSH_INTERVAL = 5.0
+
+# columns of every stream, name: (dtype, shape of a sample), as reported by
+# the SDK callbacks (location in mm and radians)
+STREAMS = {
+    'location': {'cartesian': ('f8', (6,)), 'joints': ('f8', (7,))},
+    'state': {'state': ('i2', ())},
+    'error': {'error_code': ('i2', ()), 'warn_code': ('i2', ())},
+    'cmdnum': {'cmdnum': ('i4', ())},
+    'brake': {'maable': ('?', (8,)), 'mtbrake': ('?', (8,))},
+}
+
+
+class Ring(object):
+    """
+    Preallocated columns of a stream and their timestamps, written in a
+    circle: a sample costs the same whatever the recording length, and
+    nothing is allocated for it. [written] counts all the samples; the
+    samples overwritten before they were taken are counted in [lost].
+    """
+    def __init__(self, columns, capacity=CAPACITY):
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.names = sorted(columns)
+        self.time = np.zeros(capacity)
+        self.columns = [np.zeros((capacity,) + shape, dtype=dtype)
+                        for dtype, shape in (columns[name] for name in self.names)]
+        self.written = 0
+        self.read = 0
+        self.lost = 0
+
+    def append(self, timestamp, values):
+        index = self.written & self.mask
+        self.time[index] = timestamp
+        for column, value in zip(self.columns, values):
+            column[index] = value
+        # counted once the row is complete, the reader stops before it
+        self.written += 1
+
+    def segments(self, count):
+        """
+        Slices of the columns holding the newest [count] samples, oldest
+        first: one, or two when they wrap around the end.
+        """
+        end = self.written
+        count = min(count, end, self.capacity)
+        if count <= 0:
+            return []
+        start, stop = (end - count) & self.mask, end & self.mask
+        if start < stop:
+            return [slice(start, stop)]
+        return [piece for piece in (slice(start, self.capacity), slice(0, stop)) if piece.stop > piece.start]
+
+    def take(self):
+        """
+        Columns of the samples written since the last take, oldest first,
+        None if there is none. Only one thread may take.
+        """
+        end = self.written
+        start = max(self.read, end - self.capacity)
+        self.lost += start - self.read
+        self.read = end
+        if start == end:
+            return None
+        index = np.arange(start, end) & self.mask
+        chunk = {'time': self.time[index]}
+        for name, column in zip(self.names, self.columns):
+            chunk[name] = column[index]
+        # rows lapped by the writer while they were copied, the row being
+        # written is not counted yet but its slot is already reused
+        overwritten = self.written + 1 - self.capacity - start
+        if overwritten > 0:
+            self.lost += overwritten
+            chunk = {name: values[overwritten:] for name, values in chunk.items()}
+        return chunk
+
+
+class Recorder(object):
+    """
+    Record the xArm reports, a Ring per stream flushed by a thread every
+    [interval] seconds to [directory] as <stream>-<chunk>.npz files of
+    columns, see load.
+    """
+    def __init__(self, directory, capacity=CAPACITY, interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.rings = {name: Ring(columns, capacity) for name, columns in STREAMS.items()}
+        self.chunks = dict.fromkeys(STREAMS, 0)
+        self.running = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.running = True
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.flush_thread, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def record(self, stream, *values):
+        """
+        Add a sample to a stream, its values in the order of the sorted
+        column names of STREAMS.
+        """
+        if self.running:
+            self.rings[stream].append(time.time(), values)
+
+    def flush(self):
+        for name, ring in self.rings.items():
+            chunk = ring.take()
+            if chunk is None:
+                continue
+            try:
+                np.savez(os.path.join(self.directory, '{}-{:06d}.npz'.format(name, self.chunks[name])), **chunk)
+                self.chunks[name] += 1
+            except Exception as e:
+                print(e)
+
+    def flush_thread(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
+
+    def counters(self):
+        """
+        (recorded, lost) samples by stream.
+        """
+        return ({name: ring.written for name, ring in self.rings.items()},
+                {name: ring.lost for name, ring in self.rings.items()})
+
+
+def load(directory, stream):
+    """
+    Columns of a recorded stream, its chunks put back together.
+    """
+    chunks = [dict(np.load(name)) for name in sorted(glob.glob(os.path.join(directory, stream + '-*.npz')))]
+    if not chunks:
+        return None
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+if __name__ == '__main__':
+    import sys
+    import gc
+    import shutil
+    import tempfile
+
+    # a take while the writer is halfway through a row: the full ring holds
+    # 0..7 and row 8 reuses the slot of row 0 before it is counted
+    ring = Ring({'value': ('f8', ())}, 8)
+    for i in range(8):
+        ring.append(i, [i])
+    ring.time[0] = 8
+    chunk = ring.take()
+    assert chunk['time'].tolist() == list(range(1, 8)), chunk['time']
+    assert chunk['value'].tolist() == list(range(1, 8)) and ring.lost == 1, (chunk['value'], ring.lost)
+
+    # python -m xArm.recorder [hours] [rate]
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 0.25
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    count = int(hours * 3600 * rate)
+    directory = tempfile.mkdtemp()
+    recorder = Recorder(directory, interval=FLUSH_INTERVAL * 250.0 / rate / 20)
+    cartesian = [200.0, 0.0, 150.0, 3.14, 0.0, 0.0]
+    joints = [0.1] * 7
+    collections = sum(stat['collections'] for stat in gc.get_stats())
+    recorder.start()
+    # replayed about 20 times faster than real time, flushes scaled alike
+    times = []
+    start = time.time()
+    for i in range(count):
+        t = time.perf_counter()
+        recorder.record('location', cartesian, joints)
+        if i % 1000 == 0:
+            times.append(time.perf_counter() - t)
+        if i % 100 == 0:
+            recorder.record('cmdnum', i)
+        if i % 50 == 0:
+            time.sleep(50 / (20.0 * rate))
+    recorder.stop()
+    elapsed = time.time() - start
+    recorded, lost = recorder.counters()
+    samples = load(directory, 'location')
+    size = sum(os.path.getsize(name) for name in glob.glob(os.path.join(directory, '*')))
+    print('{} location samples ({:.1f}h at {}Hz) in {:.1f}s, {} chunks, {:.1f}MB'.format(
+        count, hours, rate, elapsed, recorder.chunks['location'], size / 1e6))
+    print('record: median {:.2f}us, max {:.2f}us, first {:.2f}us, last {:.2f}us'.format(
+        np.median(times) * 1e6, np.max(times) * 1e6, np.mean(times[:10]) * 1e6, np.mean(times[-10:]) * 1e6))
+    print('loaded {} samples, lost {}, gc collections {}, ring memory {:.1f}MB'.format(
+        len(samples['time']), lost['location'], sum(stat['collections'] for stat in gc.get_stats()) - collections,
+        sum(column.nbytes for ring in recorder.rings.values() for column in ring.columns + [ring.time]) / 1e6))
+    shutil.rmtree(directory)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# Software License Agreement (BSD License)
+#
+# Copyright (c) 2018, UFACTORY, Inc.
+# All rights reserved.
+#
+# Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
+
+import time
+import threading
+from collections import deque
+import numpy as np
+
+# times per second the GUI takes the pending reports
+FRAME_RATE = 30
+
+RAD_DEGREE = 57.295779513082320876798154814105
+
+# conversion factors of location reports, by (cartesian, joints) counts
+_location_scales = {}
+
+
+def location_values(pos, angles):
+    """
+    (position, angles) of a location report for display, rounded to 0.1:
+    mm for x/y/z, degrees for the rest. Converted as one array instead of
+    a format and a parse per value, with the same result: np.round does not
+    always round like '{:.1f}' (0.35 is 0.4, but 0.3 formatted), so values
+    half-way between two decimals are formatted.
+    """
+    key = (len(pos), len(angles))
+    scale = _location_scales.get(key)
+    if scale is None:
+        scale = np.full(key[0] + key[1], RAD_DEGREE)
+        scale[:3] = 1.0
+        scale[6:key[0]] = 1.0
+        _location_scales[key] = scale
+    values = np.fromiter(pos + angles, dtype=float, count=len(scale))
+    values *= scale
+    tenths = values * 10
+    rounded = np.rint(tenths)
+    # half-way in tenths, up to the rounding of the product
+    ties = np.flatnonzero(np.abs(np.abs(tenths - rounded) - 0.5) < 1e-6)
+    rounded /= 10
+    result = rounded.tolist()
+    for i in ties.tolist():
+        result[i] = float('{:.1f}'.format(values[i]))
+    return result[:key[0]], result[key[0]:]
+
+
+class ReportChannel(object):
+    """
+    Reports from the SDK threads to the GUI, taken once per frame.
+    The types in [latest] only keep their newest item: a slot is dirty until
+    taken, and an item replacing a dirty one is a dropped frame. Other types
+    are events, all kept in order.
+    """
+    def __init__(self, latest=()):
+        self.latest = set(latest)
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.events = deque()
+        self.received = {}
+        self.dropped = {}
+
+    def put(self, report_type, item):
+        with self.lock:
+            self.received[report_type] = self.received.get(report_type, 0) + 1
+            if report_type in self.latest:
+                if report_type in self.slots:
+                    self.dropped[report_type] = self.dropped.get(report_type, 0) + 1
+                self.slots[report_type] = item
+            else:
+                self.events.append((report_type, item))
+
+    def take(self):
+        """
+        Pending reports as (type, item): the events in order, then the
+        newest item of every dirty slot.
+        """
+        with self.lock:
+            if not self.slots and not self.events:
+                return []
+            reports = list(self.events)
+            self.events.clear()
+            reports.extend(self.slots.items())
+            self.slots = {}
+        return reports
+
+    def counters(self):
+        """
+        (received, dropped) reports by type since the start.
+        """
+        with self.lock:
+            return dict(self.received), dict(self.dropped)
+
+
+class FrameCounter(object):
+    """
+    Frames per second of a panel, a frame being a redraw: tick on every
+    redraw, update once in a while to get the rate since the last update.
+    """
+    def __init__(self):
+        self.count = 0
+        self.start = time.time()
+        self.fps = 0.0
+
+    def tick(self):
+        self.count += 1
+
+    def update(self):
+        now = time.time()
+        if now > self.start:
+            self.fps = self.count / (now - self.start)
+        self.count = 0
+        self.start = now
+        return self.fps
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import random
+
+    # python -m xArm.report [rate] [seconds]
+    rate = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 4.0
+    random.seed(0)
+
+    def format_values(pos, angles):
+        # the conversion done before location_values
+        return ([float('{:.1f}'.format(p * RAD_DEGREE)) if 2 < i < 6 else float('{:.1f}'.format(p))
+                 for i, p in enumerate(pos)],
+                [float('{:.1f}'.format(angle * RAD_DEGREE)) for angle in angles])
+
+    # the robot moves half of the time and stands still the other half
+    count = int(rate * seconds)
+    reports = []
+    pos = [random.uniform(-500, 500) for _ in range(3)] + [random.uniform(-3, 3) for _ in range(3)]
+    angles = [random.uniform(-3, 3) for _ in range(7)]
+    for i in range(count):
+        if i % (2 * rate) < rate:
+            pos = [p + random.uniform(-0.1, 0.1) for p in pos]
+            angles = [a + random.uniform(-0.001, 0.001) for a in angles]
+        reports.append((pos, angles))
+    same = all(format_values(p, a) == location_values(tuple(p), tuple(a)) for p, a in reports)
+    # values half-way between two decimals, in mm and in degrees
+    halves = [(k + 0.5) / 10 for k in range(-5000, 5000)]
+    for i in range(0, len(halves), 13):
+        pos = halves[i:i + 3] + [h / RAD_DEGREE for h in halves[i + 3:i + 6]]
+        angles = [h / RAD_DEGREE for h in halves[i + 6:i + 13]]
+        if len(angles) == 7:
+            same = same and format_values(pos, angles) == location_values(tuple(pos), tuple(angles))
+
+    def run(convert, skip):
+        channel = ReportChannel(latest=('location',))
+        last = None
+        start = time.process_time()
+        for pos, angles in reports:
+            pos, angles = tuple(pos), tuple(angles)
+            if skip and (pos, angles) == last:
+                continue
+            last = (pos, angles)
+            position, joints = convert(pos, angles)
+            channel.put('location', {'position': position, 'angles': joints})
+        return time.process_time() - start
+
+    t_old = run(format_values, False)
+    t_new = run(location_values, True)
+    print('{} reports at {}Hz, same values: {}'.format(count, rate, same))
+    print('format: {:.1f}ms ({:.2f}% of a core), numpy + skip: {:.1f}ms ({:.2f}% of a core)'.format(
+        t_old * 1000, 100 * t_old / seconds, t_new * 1000, 100 * t_new / seconds))
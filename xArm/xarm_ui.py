@@ -9,6 +9,7 @@
 import functools
 import os
 import sys
+import time
 from PyQt5.QtCore import Qt
 from PyQt5.Qt import QTabWidget, QFrame, QToolBox, QGroupBox, QMessageBox
 from PyQt5.Qt import QVBoxLayout, QGridLayout, QHBoxLayout
@@ -16,6 +17,7 @@ from PyQt5.Qt import QLabel, QLineEdit, QPushButton, QSpinBox, QSlider, QComboBo
 
 from .joint_ui import JointUI
 from .cartesian_ui import CartesianUI
+from .plot_ui import StripChart
 from .handler import XArmHandler
 
 sys.path.append('..')
@@ -59,6 +61,8 @@ i18n = {
         'SetServoAddr32': 'SetServoAddr32',
         'SetServoZero': 'SetServoZero',
         'GetServoDebugMsg': 'GetServoDebugMsg',
+        'Record': '记录',
+        'Plot': '曲线',
     },
     'en': {
         'Connect': 'Connect',
@@ -89,6 +93,8 @@ i18n = {
         'SetServoAddr32': 'SetServoAddr32',
         'SetServoZero': 'SetServoZero',
         'GetServoDebugMsg': 'GetServoDebugMsg',
+        'Record': 'Record',
+        'Plot': 'Plot',
     }
 }
 
@@ -153,6 +159,11 @@ class XArmUI(object):
         common_top_layout.addWidget(self.lnt_addr)
         common_top_layout.addWidget(self.btn_connect)
 
+        # record the reports to telemetry/<date-time>, see XArmHandler.start_recording
+        self.btn_record = QPushButton(i18n[self.lang]['Record'])
+        self.btn_record.setCheckable(True)
+        common_top_layout.addWidget(self.btn_record)
+
         # common_down_frame = QFrame()
         # common_down_layout = QHBoxLayout(common_down_frame)
         # common_down_layout.setSpacing(0)
@@ -212,6 +223,10 @@ class XArmUI(object):
         tab_widget.addTab(toolBox1, i18n[self.lang]['Joint'])
         tab_widget.addTab(toolBox2, i18n[self.lang]['Cartesian'])
 
+        # joint, TCP and command count over the last minutes
+        self.plot_ui = StripChart(self.handler.history)
+        tab_widget.addTab(self.plot_ui, i18n[self.lang]['Plot'])
+
         joint_layout = QVBoxLayout(groupBox1)
         cartesian_layout = QVBoxLayout(groupBox2)
 
@@ -313,6 +328,7 @@ class XArmUI(object):
 
     def connect_slot(self):
         self.btn_connect.clicked.connect(self.connect)
+        self.btn_record.toggled.connect(self.record)
         self.slider_speed.valueChanged.connect(
             functools.partial(self.slider_spinbox_related, slave=self.spinbox_speed, scale=1))
         self.spinbox_speed.valueChanged.connect(
@@ -347,6 +363,9 @@ class XArmUI(object):
     def reset_flag(self):
         self.cartesian_ui.reset_flag()
         self.axis_ui.reset_flag()
+        # the handler drops reports equal to the last one, the panels must
+        # get the next one to show the robot again
+        self.handler.last_location = None
 
     def update_maable_mtbrake(self, maable, mtbrake):
         try:
@@ -433,6 +452,15 @@ class XArmUI(object):
         except Exception as e:
             print(e)
 
+    def record(self, checked):
+        try:
+            if checked:
+                self.handler.start_recording(os.path.join('telemetry', time.strftime('%Y%m%d-%H%M%S')))
+            else:
+                self.handler.stop_recording()
+        except Exception as e:
+            print(e)
+
     def connect(self, event):
         try:
             if str(self.btn_connect.text()) == i18n[self.lang]['Connect']: